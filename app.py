@@ -1,94 +1,761 @@
-from flask import Flask, render_template, g, request, jsonify, session
+import time
+# Cold-start report: a timestamp after each group of imports (see startup_report)
+_startup_marks = [('start', time.perf_counter())]
+
+from flask import Flask, Response, render_template, g, request, jsonify, session, url_for, send_from_directory, has_request_context, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from werkzeug.exceptions import HTTPException
+from werkzeug.security import generate_password_hash, check_password_hash, safe_join
+import click
+_startup_marks.append(('flask', time.perf_counter()))
+
 import sqlite3
 import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from werkzeug.security import generate_password_hash, check_password_hash
+import re
+import base64
+import csv
+import io
+import functools
+import importlib.util
+import itertools
+import datetime
+import json
+import queue
+import select
+import hashlib
+import urllib.parse
+import mimetypes
+import gzip
+import zlib
+import threading
+from collections import OrderedDict, deque
+_startup_marks.append(('stdlib', time.perf_counter()))
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# zstandard alone costs ~30 ms of import time: _ZstdStream imports it on first use
+HAS_ZSTANDARD = importlib.util.find_spec('zstandard') is not None
+_startup_marks.append(('codecs', time.perf_counter()))
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('PLANNER_SECRET', 'dev-secret')
 APP_PASSWORD = os.environ.get('APP_PASSWORD', 'Planner2026$%&')
+# Flask leaves its logger at the root default (WARNING) outside debug mode;
+# startup, migration and archival reports are logged at INFO
+app.logger.setLevel(os.environ.get('LOG_LEVEL', 'INFO').upper())
 
 # Configuration
 DATABASE_URL = os.environ.get('DATABASE_URL')
 IS_POSTGRES = DATABASE_URL is not None and DATABASE_URL.startswith('postgres')
-DATABASE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'planner.db')
+
+# The Postgres driver is only imported when it is the configured backend
+if IS_POSTGRES:
+    import psycopg2
+    import psycopg2.extensions
+    from psycopg2.extras import RealDictCursor, execute_values
+    DB_INTEGRITY_ERRORS = (sqlite3.IntegrityError, psycopg2.IntegrityError)
+    DB_DISCONNECT_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+else:
+    DB_INTEGRITY_ERRORS = (sqlite3.IntegrityError,)
+    DB_DISCONNECT_ERRORS = ()
+_startup_marks.append(('driver', time.perf_counter()))
+DATABASE_FILE = os.environ.get('DATABASE_FILE') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'planner.db')
+
+# Connection pool (Postgres only)
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', '1'))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', '10'))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '10'))
+DB_POOL_MAX_AGE = float(os.environ.get('DB_POOL_MAX_AGE', '1800'))
+DB_POOL_MAX_IDLE = float(os.environ.get('DB_POOL_MAX_IDLE', '300'))
+DB_POOL_PING_AFTER = float(os.environ.get('DB_POOL_PING_AFTER', '30'))
+
+class PoolTimeout(Exception):
+    pass
+
+class ConnectionPool:
+    """Thread-safe pool of reusable DB connections.
+
+    Connections are health-checked on checkout (pinged when they have been
+    idle longer than ``ping_after``), recycled once older than ``max_age``
+    and rolled back when returned, so the next request starts clean.
+    """
+
+    def __init__(self, connect, minconn=1, maxconn=10, timeout=10,
+                 max_age=1800, max_idle=300, ping_after=30):
+        self._connect = connect
+        self.minconn = minconn
+        self.maxconn = max(maxconn, 1)
+        self.timeout = timeout
+        self.max_age = max_age
+        self.max_idle = max_idle
+        self.ping_after = ping_after
+        self._cond = threading.Condition()
+        self._idle = []      # [(conn, created_at, last_used)]
+        self._in_use = {}    # id(conn) -> created_at
+        self._size = 0
+        self._counters = {
+            'checkouts': 0, 'created': 0, 'recycled': 0, 'discarded': 0,
+            'pings': 0, 'waits': 0, 'timeouts': 0, 'wait_time': 0.0,
+        }
+
+    def getconn(self):
+        start = time.monotonic()
+        entry = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if self._size < self.maxconn:
+                    self._size += 1
+                    break
+                remaining = self.timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    self._counters['timeouts'] += 1
+                    raise PoolTimeout(f"Nessuna connessione disponibile dopo {self.timeout}s")
+                self._counters['waits'] += 1
+                self._cond.wait(remaining)
+            self._counters['wait_time'] += time.monotonic() - start
+
+        try:
+            conn, created_at = self._checkout(entry)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._in_use[id(conn)] = created_at
+            self._counters['checkouts'] += 1
+        return conn
+
+    def _checkout(self, entry):
+        if entry is not None:
+            conn, created_at, last_used = entry
+            now = time.monotonic()
+            if now - created_at > self.max_age:
+                self._close(conn)
+                self._bump('recycled')
+            elif self._healthy(conn, now - last_used):
+                return conn, created_at
+            else:
+                self._close(conn)
+                self._bump('discarded')
+        conn = self._connect()
+        self._bump('created')
+        return conn, time.monotonic()
+
+    def _healthy(self, conn, idle_for):
+        if getattr(conn, 'closed', False):
+            return False
+        if idle_for < self.ping_after:
+            return True
+        self._bump('pings')
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT 1')
+            cur.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def putconn(self, conn, discard=False):
+        with self._cond:
+            created_at = self._in_use.pop(id(conn), None)
+        if created_at is None:
+            # Not ours (or already returned)
+            return
+
+        if not discard and not getattr(conn, 'closed', False):
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+        else:
+            discard = True
+
+        now = time.monotonic()
+        with self._cond:
+            if discard or now - created_at > self.max_age:
+                self._size -= 1
+                self._counters['discarded' if discard else 'recycled'] += 1
+                stale = [conn]
+            else:
+                self._idle.append((conn, created_at, now))
+                stale = self._prune_idle(now)
+            self._cond.notify()
+        for c in stale:
+            self._close(c)
+
+    def _prune_idle(self, now):
+        # Called with the lock held; keeps at least minconn connections around
+        stale = []
+        keep = []
+        for entry in self._idle:
+            if self._size > self.minconn and now - entry[2] > self.max_idle:
+                stale.append(entry[0])
+                self._size -= 1
+            else:
+                keep.append(entry)
+        self._idle = keep
+        return stale
+
+    def _bump(self, name):
+        with self._cond:
+            self._counters[name] += 1
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def closeall(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for conn, _, _ in idle:
+            self._close(conn)
+
+    def stats(self):
+        with self._cond:
+            data = dict(self._counters)
+            data.update({
+                'min': self.minconn,
+                'max': self.maxconn,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+            })
+        data['wait_time'] = round(data['wait_time'], 6)
+        return data
+
+# Statement layer (Postgres)
+#
+# Routes write SQL with qmark placeholders. Each distinct SQL text is
+# translated once (cached) into psycopg2's pyformat and into a $n form used
+# for server-side prepared statements; statements executed at least
+# DB_PREPARE_THRESHOLD times on a pooled connection are PREPAREd there and
+# run with EXECUTE afterwards. Statements with generated parameter lists
+# (IN (?, ?, ...), multi-row VALUES) change text with their length and are
+# never prepared. Plans are dropped (DEALLOCATE ALL) on every connection after
+# a migration, or when Postgres reports a plan made stale by a schema change
+# elsewhere. Transaction-mode poolers (pgbouncer, Supabase/Supavisor on port
+# 6543) hand each transaction a different server session, so prepared
+# statements are off by default there and on Vercel; DB_PREPARE=0/1 decides
+# explicitly.
+
+def _transaction_pooler(dsn):
+    try:
+        return urllib.parse.urlsplit(dsn).port == 6543
+    except ValueError:
+        return False
+
+DB_PREPARE = os.environ.get(
+    'DB_PREPARE', '0' if os.environ.get('VERCEL') or _transaction_pooler(DATABASE_URL or '') else '1'
+) != '0'
+DB_PREPARE_THRESHOLD = int(os.environ.get('DB_PREPARE_THRESHOLD', '2'))
+DB_PREPARE_MAX = int(os.environ.get('DB_PREPARE_MAX', '100'))
+STATEMENT_CACHE_SIZE = int(os.environ.get('STATEMENT_CACHE_SIZE', '512'))
+PREPARABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+GENERATED_LIST = re.compile(r'\bIN\s*\(\s*\?|\)\s*,\s*\(\s*\?', re.IGNORECASE)
+# feature_not_supported ("cached plan must not change result type"),
+# invalid_sql_statement_name (plan deallocated behind our back)
+STALE_PLAN_ERRORS = ('0A000', '26000')
+
+@functools.lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def translate_sql(query):
+    """Translate a qmark query; return (pyformat_sql, numbered_sql, n_params).
+
+    ``?`` inside string literals, quoted identifiers, comments and
+    dollar-quoted bodies is left alone; ``%`` is escaped for pyformat.
+    """
+    pyformat = []
+    numbered = []
+    n = 0
+    i = 0
+    length = len(query)
+    while i < length:
+        ch = query[i]
+        end = None
+        if ch in ("'", '"'):
+            end = query.find(ch, i + 1)
+            while end != -1 and end + 1 < length and query[end + 1] == ch:
+                end = query.find(ch, end + 2)
+            end = length if end == -1 else end + 1
+        elif query.startswith('--', i):
+            end = query.find('\n', i)
+            end = length if end == -1 else end
+        elif query.startswith('/*', i):
+            end = query.find('*/', i + 2)
+            end = length if end == -1 else end + 2
+        elif ch == '$':
+            tag_end = query.find('$', i + 1)
+            tag = query[i:tag_end + 1] if tag_end != -1 else ''
+            if tag and (len(tag) == 2 or tag[1:-1].isidentifier()):
+                end = query.find(tag, tag_end + 1)
+                end = length if end == -1 else end + len(tag)
+        if end is not None:
+            chunk = query[i:end]
+            pyformat.append(chunk.replace('%', '%%'))
+            numbered.append(chunk)
+            i = end
+            continue
+        if ch == '?':
+            n += 1
+            pyformat.append('%s')
+            numbered.append(f'${n}')
+        elif ch == '%':
+            pyformat.append('%%')
+            numbered.append(ch)
+        else:
+            pyformat.append(ch)
+            numbered.append(ch)
+        i += 1
+    return ''.join(pyformat), ''.join(numbered), n
+
+class PreparedStatements:
+    """Server-side prepared statements of one Postgres connection."""
+
+    # Bumped to make every connection drop its plans (see invalidate_all)
+    epoch = 0
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._names = OrderedDict()  # sql -> statement name (LRU)
+        self._seen = {}              # sql -> executions before preparing
+        self._rejected = set()
+        self._counter = 0
+        self.epoch = PreparedStatements.epoch
+
+    @classmethod
+    def invalidate_all(cls):
+        """Make every connection DEALLOCATE its plans before its next statement."""
+        cls.epoch += 1
+
+    def reset(self):
+        if self._names:
+            self.conn.cursor().execute('DEALLOCATE ALL')
+        self._names.clear()
+        self._seen.clear()
+        self._rejected.clear()
+        self.epoch = PreparedStatements.epoch
+
+    def name_for(self, query, numbered):
+        if self.epoch != PreparedStatements.epoch:
+            self.reset()
+        name = self._names.get(query)
+        if name is not None:
+            self._names.move_to_end(query)
+            return name
+        if query in self._rejected or not query.lstrip().upper().startswith(PREPARABLE):
+            return None
+        if GENERATED_LIST.search(query):
+            return None
+        if len(self._seen) > STATEMENT_CACHE_SIZE:
+            self._seen.clear()
+        seen = self._seen[query] = self._seen.get(query, 0) + 1
+        if seen < DB_PREPARE_THRESHOLD:
+            return None
+
+        self._counter += 1
+        name = f'planner_ps_{self._counter}'
+        cur = self.conn.cursor()
+        try:
+            # Savepoint so a statement Postgres cannot prepare (e.g. untyped
+            # parameters) doesn't abort the caller's transaction
+            cur.execute(f'SAVEPOINT planner_prepare; PREPARE {name} AS {numbered}; RELEASE SAVEPOINT planner_prepare')
+        except psycopg2.Error:
+            cur.execute('ROLLBACK TO SAVEPOINT planner_prepare')
+            self._rejected.add(query)
+            self._seen.pop(query, None)
+            return None
+        self._seen.pop(query, None)
+        self._names[query] = name
+        if len(self._names) > DB_PREPARE_MAX:
+            _, old = self._names.popitem(last=False)
+            cur.execute(f'DEALLOCATE {old}')
+        return name
+
+    def __len__(self):
+        return len(self._names)
+
+if IS_POSTGRES:
+    class PlannerConnection(psycopg2.extensions.connection):
+        """psycopg2 connection carrying its own prepared statement registry."""
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.prepared = PreparedStatements(self)
+
+_pg_pool = None
+_pg_pool_lock = threading.Lock()
+
+def get_pg_pool():
+    global _pg_pool
+    if _pg_pool is None:
+        with _pg_pool_lock:
+            if _pg_pool is None:
+                _pg_pool = ConnectionPool(
+                    lambda: psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor, connection_factory=PlannerConnection),
+                    minconn=DB_POOL_MIN,
+                    maxconn=DB_POOL_MAX,
+                    timeout=DB_POOL_TIMEOUT,
+                    max_age=DB_POOL_MAX_AGE,
+                    max_idle=DB_POOL_MAX_IDLE,
+                    ping_after=DB_POOL_PING_AFTER,
+                )
+    return _pg_pool
+
+# SQLite profile
+#
+# A bounded pool (SQLITE_POOL_MAX) of tuned connections (WAL,
+# synchronous=NORMAL, mmap and page cache sizing, busy timeout), checked out
+# by get_db and returned at teardown, whatever thread serves the request. Writers in
+# the process go through a FIFO queue: a request takes its turn at its first
+# write statement and gives it back on commit/rollback, so bursts of writes
+# wait in line instead of failing with "database is locked". Other
+# processes are covered by the busy timeout only.
+
+SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', '5000'))  # ms
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', '-16000'))  # negative: KiB
+SQLITE_POOL_MAX = int(os.environ.get('SQLITE_POOL_MAX', '10'))
+SQLITE_POOL_TIMEOUT = float(os.environ.get('SQLITE_POOL_TIMEOUT', '10'))
+SQLITE_WRITE_QUEUE = os.environ.get('SQLITE_WRITE_QUEUE', '1') != '0'
+SQLITE_WRITE_TIMEOUT = float(os.environ.get('SQLITE_WRITE_TIMEOUT', '30'))
+SQLITE_WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'CREATE', 'DROP', 'ALTER', 'BEGIN')
+
+@functools.lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def is_write_sql(query):
+    return query.lstrip().upper().startswith(SQLITE_WRITE_STATEMENTS)
+
+class WriteQueue:
+    """FIFO lock handing the database to one writer at a time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = deque()
+        self._busy = False
+        self._counters = {'acquired': 0, 'waited': 0, 'wait_time': 0.0, 'timeouts': 0, 'max_depth': 0}
+
+    def acquire(self, timeout):
+        with self._lock:
+            self._counters['acquired'] += 1
+            if not self._busy and not self._waiters:
+                self._busy = True
+                return True
+            waiter = threading.Event()
+            self._waiters.append(waiter)
+            self._counters['waited'] += 1
+            self._counters['max_depth'] = max(self._counters['max_depth'], len(self._waiters))
+        started = time.perf_counter()
+        granted = waiter.wait(timeout)
+        with self._lock:
+            self._counters['wait_time'] += time.perf_counter() - started
+            if not granted and not waiter.is_set():
+                self._waiters.remove(waiter)
+                self._counters['acquired'] -= 1
+                self._counters['timeouts'] += 1
+                return False
+        return True
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                # Hand over directly so the next writer cannot be overtaken
+                self._waiters.popleft().set()
+            else:
+                self._busy = False
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._counters, waiting=len(self._waiters), busy=self._busy)
+        data['wait_time'] = round(data['wait_time'], 6)
+        return data
+
+def configure_sqlite(conn):
+    conn.execute(f'PRAGMA journal_mode={SQLITE_JOURNAL_MODE}')
+    conn.execute(f'PRAGMA synchronous={SQLITE_SYNCHRONOUS}')
+    conn.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}')
+    conn.execute(f'PRAGMA mmap_size={SQLITE_MMAP_SIZE}')
+    conn.execute(f'PRAGMA cache_size={SQLITE_CACHE_SIZE}')
+
+class SQLiteConnection(sqlite3.Connection):
+    """sqlite3 connection remembering the database file it was opened on."""
+    path = None
+
+class SQLiteConnections(ConnectionPool):
+    """Bounded pool of tuned SQLite connections shared by all threads.
+
+    Connections are opened with check_same_thread=False: each one serves a
+    single request at a time, but not necessarily on the thread that opened
+    it (the development server starts a thread per request). They go back
+    to the pool at teardown, so reuse doesn't depend on thread lifetime.
+    """
+
+    def __init__(self):
+        super().__init__(self._open, minconn=1, maxconn=SQLITE_POOL_MAX, timeout=SQLITE_POOL_TIMEOUT,
+                         max_age=float('inf'), max_idle=DB_POOL_MAX_IDLE, ping_after=float('inf'))
+        self.write_queue = WriteQueue() if SQLITE_WRITE_QUEUE else None
+
+    def _open(self):
+        conn = sqlite3.connect(DATABASE_FILE, timeout=SQLITE_BUSY_TIMEOUT / 1000,
+                               cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False,
+                               factory=SQLiteConnection)
+        conn.path = DATABASE_FILE
+        conn.row_factory = sqlite3.Row
+        configure_sqlite(conn)
+        return conn
+
+    def getconn(self):
+        conn = super().getconn()
+        while conn.path != DATABASE_FILE:
+            # DATABASE_FILE changed at runtime (tests, bench): drop the old ones
+            self.putconn(conn, discard=True)
+            self.closeall()
+            conn = super().getconn()
+        return conn
+
+    def stats(self):
+        data = super().stats()
+        data['reused'] = data['checkouts'] - data['created']
+        data['journal_mode'] = SQLITE_JOURNAL_MODE
+        data['write_queue'] = self.write_queue.stats() if self.write_queue is not None else None
+        return data
+
+sqlite_connections = SQLiteConnections()
+
+_stream_ids = itertools.count(1)
+
+# Bound parameters per statement (SQLITE_MAX_VARIABLE_NUMBER since 3.32)
+SQLITE_MAX_VARIABLES = 32766
+
+def _copy_value(value):
+    # COPY csv: an unquoted empty field is NULL, a quoted one an empty string
+    if value is None:
+        return ''
+    return '"' + str(value).replace('"', '""') + '"'
 
 class DBWrapper:
-    def __init__(self, conn, is_postgres=False):
+    def __init__(self, conn, is_postgres=False, pool=None):
         self.conn = conn
         self.is_postgres = is_postgres
+        self.pool = pool
+        self.write_queue = getattr(pool, 'write_queue', None)
+        self._writer = False
+        self._after_commit = []
+        # Per-request instrumentation, read by record_request_metrics
+        self.query_count = 0
+        self.query_time = 0.0
+        self.connect_time = 0.0
 
     def execute(self, query, params=()):
-        if self.is_postgres:
-            # Convert ? to %s for Postgres
-            query = query.replace('?', '%s')
-            # Handle rowid replacement for Postgres (not supported, usually logic needs change)
-            # But we handle logic changes in the routes.
-        
+        started = time.perf_counter()
+        try:
+            return self._execute(query, params)
+        finally:
+            self._record(query, started)
+
+    def _execute(self, query, params):
+        if not self.is_postgres:
+            self._claim_writer(query)
+            return self.conn.execute(query, params)
+
+        cur = self.conn.cursor()
+        if not params:
+            # Nothing to bind: psycopg2 leaves the text untouched
+            cur.execute(query)
+            return cur
+        pyformat, numbered, _ = translate_sql(query)
+        prepared = getattr(self.conn, 'prepared', None)
+        name = prepared.name_for(query, numbered) if DB_PREPARE and prepared is not None else None
+        if name is not None:
+            try:
+                cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+            except psycopg2.Error as e:
+                if e.pgcode in STALE_PLAN_ERRORS:
+                    # Schema changed under the plans (e.g. migrated by another process)
+                    PreparedStatements.invalidate_all()
+                raise
+        else:
+            cur.execute(pyformat, params)
+        return cur
+
+    def executemany(self, query, seq_of_params):
+        started = time.perf_counter()
         try:
             if self.is_postgres:
                 cur = self.conn.cursor()
-                cur.execute(query, params)
+                cur.executemany(translate_sql(query)[0], seq_of_params)
                 return cur
-            else:
-                return self.conn.execute(query, params)
-        except Exception as e:
-            # self.conn.rollback() # Optional: auto-rollback
-            raise e
+            self._claim_writer(query)
+            return self.conn.executemany(query, seq_of_params)
+        finally:
+            self._record(query, started)
+
+    def bulk_insert(self, table, columns, rows):
+        """Insert ``rows`` into ``table``: COPY on Postgres, executemany on SQLite."""
+        if not rows:
+            return
+        if not self.is_postgres:
+            placeholders = ', '.join(['?'] * len(columns))
+            self.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+            return
+        started = time.perf_counter()
+        buf = io.StringIO()
+        for row in rows:
+            buf.write(','.join(_copy_value(value) for value in row) + '\n')
+        buf.seek(0)
+        query = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+        try:
+            self.conn.cursor().copy_expert(query, buf)
+        finally:
+            self._record(query, started)
+
+    def insert_returning(self, table, columns, rows, page_size=500):
+        """Insert ``rows`` with multi-row INSERTs and return their new ids, in row order.
+
+        execute_values on Postgres, INSERT ... VALUES (...), (...) RETURNING id
+        on SQLite. Ids are sorted because RETURNING doesn't guarantee an order,
+        while both backends assign them in row order within a statement.
+        """
+        if not rows:
+            return []
+        head = f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+        if self.is_postgres:
+            query = head + '%s RETURNING id'
+            started = time.perf_counter()
+            try:
+                fetched = execute_values(self.conn.cursor(), query, rows, page_size=page_size, fetch=True)
+            finally:
+                self._record(query, started)
+            return sorted(row['id'] for row in fetched)
+        ids = []
+        row_sql = '(' + ', '.join(['?'] * len(columns)) + ')'
+        per_statement = min(page_size, SQLITE_MAX_VARIABLES // len(columns))
+        for start in range(0, len(rows), per_statement):
+            chunk = rows[start:start + per_statement]
+            cur = self.execute(head + ', '.join([row_sql] * len(chunk)) + ' RETURNING id',
+                               [value for row in chunk for value in row])
+            ids.extend(sorted(row['id'] for row in cur.fetchall()))
+        return ids
+
+    def iterate(self, query, params=(), batch_size=500):
+        """Yield the result of ``query`` in lists of at most ``batch_size`` rows.
+
+        On Postgres this uses a server-side (named) cursor, so rows are only
+        transferred as batches are consumed.
+        """
+        started = time.perf_counter()
+        if self.is_postgres:
+            cur = self.conn.cursor(name=f'planner_stream_{next(_stream_ids)}')
+            cur.itersize = batch_size
+            cur.execute(translate_sql(query)[0] if params else query, params or None)
+        else:
+            cur = self.conn.execute(query, params)
+        self._record(query, started)
+        try:
+            while True:
+                started = time.perf_counter()
+                rows = cur.fetchmany(batch_size)
+                self.query_time += time.perf_counter() - started
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cur.close()
+
+    def _record(self, query, started):
+        elapsed = time.perf_counter() - started
+        self.query_count += 1
+        self.query_time += elapsed
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            metrics.slow_query(query, elapsed)
+
+    def _claim_writer(self, query):
+        if self.write_queue is None or self._writer or not is_write_sql(query):
+            return
+        if not self.write_queue.acquire(SQLITE_WRITE_TIMEOUT):
+            raise sqlite3.OperationalError('database is locked (write queue timeout)')
+        self._writer = True
+
+    def _release_writer(self):
+        if self._writer:
+            self._writer = False
+            self.write_queue.release()
 
     def commit(self):
-        self.conn.commit()
+        try:
+            self.conn.commit()
+        finally:
+            self._release_writer()
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            callback()
+
+    def rollback(self):
+        self._after_commit = []
+        try:
+            self.conn.rollback()
+        finally:
+            self._release_writer()
+
+    def after_commit(self, callback):
+        """Run ``callback`` once the current transaction has committed."""
+        self._after_commit.append(callback)
 
-    def close(self):
-        self.conn.close()
+    def close(self, discard=False):
+        try:
+            if self.pool is not None:
+                # Hand the connection back; the pool rolls back anything left open
+                self.pool.putconn(self.conn, discard=discard)
+            else:
+                self.conn.close()
+        finally:
+            self._release_writer()
 
 def get_db():
     db = getattr(g, '_database', None)
     if db is None:
+        started = time.perf_counter()
         if IS_POSTGRES:
-            conn = psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
-            db = g._database = DBWrapper(conn, is_postgres=True)
+            pool = get_pg_pool()
+            conn = pool.getconn()
+            db = g._database = DBWrapper(conn, is_postgres=True, pool=pool)
         else:
-            conn = sqlite3.connect(DATABASE_FILE)
-            conn.row_factory = sqlite3.Row
-            db = g._database = DBWrapper(conn, is_postgres=False)
+            conn = sqlite_connections.getconn()
+            db = g._database = DBWrapper(conn, is_postgres=False, pool=sqlite_connections)
+        db.connect_time = time.perf_counter() - started
+        if AUTO_MIGRATE:
+            ensure_schema(db)
+        start_archiver()
     return db
 
-def ensure_tasks_columns(db):
-    if db.is_postgres:
-        # Postgres column check (simplified for now, assuming fresh deploy usually)
-        # Or check information_schema if needed. 
-        # For this task, we skip schema migration on Postgres for simplicity 
-        # unless we want to be very robust.
-        return
+# Schema migrations
+#
+# Each entry is (version, name, step). Steps receive the DBWrapper and must be
+# written for both SQLite and Postgres; they run inside a transaction and the
+# applied version is recorded in schema_migrations. Append new migrations at
+# the end, never edit one that has already shipped.
 
-    # SQLite logic
-    cols = {row[1] for row in db.execute('PRAGMA table_info(tasks)').fetchall()}
-    to_add = []
-    if 'description' not in cols:
-        to_add.append("ALTER TABLE tasks ADD COLUMN description TEXT")
-    if 'status' not in cols:
-        to_add.append("ALTER TABLE tasks ADD COLUMN status TEXT DEFAULT 'To Do'")
-    if 'priority' not in cols:
-        to_add.append("ALTER TABLE tasks ADD COLUMN priority TEXT")
-    if 'due_date' not in cols:
-        to_add.append("ALTER TABLE tasks ADD COLUMN due_date TEXT")
-    if 'user_id' not in cols:
-        to_add.append("ALTER TABLE tasks ADD COLUMN user_id INTEGER")
-    if 'created_by' not in cols:
-        to_add.append("ALTER TABLE tasks ADD COLUMN created_by INTEGER")
-    for stmt in to_add:
-        db.execute(stmt)
-    if to_add:
-        db.commit()
+AUTO_MIGRATE = os.environ.get('AUTO_MIGRATE', '1') != '0'
+MIGRATION_LOCK_ID = 725001  # pg_advisory_xact_lock key
 
-def init_db():
-    db = get_db()
-    
+def _m001_base_schema(db):
     if db.is_postgres:
-        # Postgres Schema
         db.execute("""
             CREATE TABLE IF NOT EXISTS users (
                 id SERIAL PRIMARY KEY,
@@ -124,7 +791,6 @@ def init_db():
             );
         """)
     else:
-        # SQLite Schema
         db.execute("""
             CREATE TABLE IF NOT EXISTS tasks (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -153,15 +819,1124 @@ def init_db():
                 FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
             );
         """)
-        ensure_tasks_columns(db)
-        
+
+def _m002_tasks_columns(db):
+    # Older databases were created with only id/title/created_at on tasks
+    columns = [
+        ('description', 'TEXT'),
+        ('status', "TEXT DEFAULT 'To Do'"),
+        ('priority', 'TEXT'),
+        ('due_date', 'TEXT'),
+        ('user_id', 'INTEGER'),
+        ('created_by', 'INTEGER'),
+    ]
+    if db.is_postgres:
+        for name, ddl in columns:
+            db.execute(f"ALTER TABLE tasks ADD COLUMN IF NOT EXISTS {name} {ddl}")
+        return
+    existing = {row[1] for row in db.execute('PRAGMA table_info(tasks)').fetchall()}
+    for name, ddl in columns:
+        if name not in existing:
+            db.execute(f"ALTER TABLE tasks ADD COLUMN {name} {ddl}")
+
+def _m003_hot_path_indexes(db):
+    # api_tasks_list: (user_id = ? OR created_by = ?) ORDER BY created_at DESC, id DESC
+    db.execute("CREATE INDEX IF NOT EXISTS idx_tasks_user_created ON tasks (user_id, created_at DESC, id DESC)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_tasks_creator_created ON tasks (created_by, created_at DESC, id DESC)")
+    # api_tasks_comments / load_comments: task_id = ? ORDER BY created_at, id
+    db.execute("CREATE INDEX IF NOT EXISTS idx_comments_task_created ON comments (task_id, created_at, id)")
+    # ON DELETE CASCADE from users
+    db.execute("CREATE INDEX IF NOT EXISTS idx_comments_user ON comments (user_id)")
+
+def _m004_change_tracking(db):
+    # Every insert/update of tasks and comments takes the next value of a
+    # global revision counter; deletes (and reassignments, which hide a task
+    # from its previous assignee) leave a tombstone. The counter is a single
+    # row updated inside the writing transaction, so revisions become visible
+    # in commit order and clients can safely ask for "everything after N".
+    if db.is_postgres:
+        db.execute("ALTER TABLE tasks ADD COLUMN IF NOT EXISTS rev BIGINT NOT NULL DEFAULT 0")
+        db.execute("ALTER TABLE comments ADD COLUMN IF NOT EXISTS rev BIGINT NOT NULL DEFAULT 0")
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS sync_state (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                rev BIGINT NOT NULL
+            );
+        """)
+        db.execute("INSERT INTO sync_state (id, rev) VALUES (1, 0) ON CONFLICT (id) DO NOTHING")
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS tombstones (
+                id SERIAL PRIMARY KEY,
+                entity TEXT NOT NULL,
+                entity_id INTEGER NOT NULL,
+                task_id INTEGER,
+                user_id INTEGER,
+                created_by INTEGER,
+                rev BIGINT NOT NULL,
+                deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+        db.execute("""
+            CREATE OR REPLACE FUNCTION bump_sync_rev() RETURNS BIGINT AS $$
+                UPDATE sync_state SET rev = rev + 1 WHERE id = 1 RETURNING rev
+            $$ LANGUAGE sql;
+        """)
+        db.execute("""
+            CREATE OR REPLACE FUNCTION set_row_rev() RETURNS trigger AS $$
+            BEGIN
+                NEW.rev := bump_sync_rev();
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql;
+        """)
+        db.execute("""
+            CREATE OR REPLACE FUNCTION tasks_tombstone() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'DELETE' THEN
+                    INSERT INTO tombstones (entity, entity_id, task_id, user_id, created_by, rev)
+                    VALUES ('task', OLD.id, OLD.id, OLD.user_id, OLD.created_by, bump_sync_rev());
+                ELSIF OLD.user_id IS DISTINCT FROM NEW.user_id THEN
+                    INSERT INTO tombstones (entity, entity_id, task_id, user_id, created_by, rev)
+                    VALUES ('task', OLD.id, OLD.id, OLD.user_id, NULL, bump_sync_rev());
+                END IF;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql;
+        """)
+        db.execute("""
+            CREATE OR REPLACE FUNCTION comments_tombstone() RETURNS trigger AS $$
+            BEGIN
+                INSERT INTO tombstones (entity, entity_id, task_id, user_id, rev)
+                VALUES ('comment', OLD.id, OLD.task_id, OLD.user_id, bump_sync_rev());
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql;
+        """)
+        db.execute("DROP TRIGGER IF EXISTS tasks_rev ON tasks")
+        db.execute("CREATE TRIGGER tasks_rev BEFORE INSERT OR UPDATE ON tasks FOR EACH ROW EXECUTE FUNCTION set_row_rev()")
+        db.execute("DROP TRIGGER IF EXISTS comments_rev ON comments")
+        db.execute("CREATE TRIGGER comments_rev BEFORE INSERT OR UPDATE ON comments FOR EACH ROW EXECUTE FUNCTION set_row_rev()")
+        db.execute("DROP TRIGGER IF EXISTS tasks_tombstone ON tasks")
+        db.execute("CREATE TRIGGER tasks_tombstone AFTER UPDATE OR DELETE ON tasks FOR EACH ROW EXECUTE FUNCTION tasks_tombstone()")
+        db.execute("DROP TRIGGER IF EXISTS comments_tombstone ON comments")
+        db.execute("CREATE TRIGGER comments_tombstone AFTER DELETE ON comments FOR EACH ROW EXECUTE FUNCTION comments_tombstone()")
+    else:
+        db.execute("ALTER TABLE tasks ADD COLUMN rev INTEGER NOT NULL DEFAULT 0")
+        db.execute("ALTER TABLE comments ADD COLUMN rev INTEGER NOT NULL DEFAULT 0")
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS sync_state (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                rev INTEGER NOT NULL
+            );
+        """)
+        db.execute("INSERT OR IGNORE INTO sync_state (id, rev) VALUES (1, 0)")
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS tombstones (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                entity TEXT NOT NULL,
+                entity_id INTEGER NOT NULL,
+                task_id INTEGER,
+                user_id INTEGER,
+                created_by INTEGER,
+                rev INTEGER NOT NULL,
+                deleted_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+        bump = "UPDATE sync_state SET rev = rev + 1 WHERE id = 1;"
+        current = "(SELECT rev FROM sync_state WHERE id = 1)"
+        for table in ('tasks', 'comments'):
+            db.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_rev_insert AFTER INSERT ON {table}
+                BEGIN
+                    {bump}
+                    UPDATE {table} SET rev = {current} WHERE id = NEW.id;
+                END;
+            """)
+            db.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_rev_update AFTER UPDATE ON {table}
+                WHEN NEW.rev IS OLD.rev
+                BEGIN
+                    {bump}
+                    UPDATE {table} SET rev = {current} WHERE id = NEW.id;
+                END;
+            """)
+        db.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS tasks_tombstone_delete AFTER DELETE ON tasks
+            BEGIN
+                {bump}
+                INSERT INTO tombstones (entity, entity_id, task_id, user_id, created_by, rev)
+                VALUES ('task', OLD.id, OLD.id, OLD.user_id, OLD.created_by, {current});
+            END;
+        """)
+        db.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS tasks_tombstone_reassign AFTER UPDATE OF user_id ON tasks
+            WHEN OLD.user_id IS NOT NEW.user_id
+            BEGIN
+                {bump}
+                INSERT INTO tombstones (entity, entity_id, task_id, user_id, created_by, rev)
+                VALUES ('task', OLD.id, OLD.id, OLD.user_id, NULL, {current});
+            END;
+        """)
+        db.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS comments_tombstone_delete AFTER DELETE ON comments
+            BEGIN
+                {bump}
+                INSERT INTO tombstones (entity, entity_id, task_id, user_id, rev)
+                VALUES ('comment', OLD.id, OLD.task_id, OLD.user_id, {current});
+            END;
+        """)
+    db.execute("CREATE INDEX IF NOT EXISTS idx_tasks_rev ON tasks (rev)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_comments_rev ON comments (rev)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_tombstones_rev ON tombstones (rev)")
+
+def login_key(name):
+    """Normalized sign-in key: case-folded, single-spaced full name."""
+    return ' '.join(name.split()).casefold()
+
+def _m005_users_login_key(db):
+    if db.is_postgres:
+        db.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS login_key TEXT")
+    else:
+        db.execute("ALTER TABLE users ADD COLUMN login_key TEXT")
+    rows = db.execute('SELECT id, first_name, last_name FROM users').fetchall()
+    db.executemany(
+        'UPDATE users SET login_key = ? WHERE id = ?',
+        [(login_key(f"{row['first_name']} {row['last_name']}"), row['id']) for row in rows]
+    )
+    db.execute("CREATE INDEX IF NOT EXISTS idx_users_login_key ON users (login_key)")
+
+def _m006_tasks_comment_summary(db):
+    # Comment summary kept on tasks by triggers, so every writer (single
+    # endpoints, batch, import, archival) keeps it consistent
+    if db.is_postgres:
+        db.execute("ALTER TABLE tasks ADD COLUMN IF NOT EXISTS comment_count INTEGER NOT NULL DEFAULT 0")
+        db.execute("ALTER TABLE tasks ADD COLUMN IF NOT EXISTS last_comment_id INTEGER")
+        db.execute("ALTER TABLE tasks ADD COLUMN IF NOT EXISTS last_comment_at TIMESTAMP")
+        db.execute("""
+            CREATE OR REPLACE FUNCTION comments_summary() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    UPDATE tasks SET comment_count = comment_count + 1,
+                        last_comment_id = NEW.id, last_comment_at = NEW.created_at
+                    WHERE id = NEW.task_id;
+                ELSE
+                    UPDATE tasks SET comment_count = GREATEST(comment_count - 1, 0),
+                        last_comment_id = (SELECT c.id FROM comments c WHERE c.task_id = OLD.task_id ORDER BY c.id DESC LIMIT 1),
+                        last_comment_at = (SELECT c.created_at FROM comments c WHERE c.task_id = OLD.task_id ORDER BY c.id DESC LIMIT 1)
+                    WHERE id = OLD.task_id;
+                END IF;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql;
+        """)
+        db.execute("DROP TRIGGER IF EXISTS comments_summary ON comments")
+        db.execute("CREATE TRIGGER comments_summary AFTER INSERT OR DELETE ON comments FOR EACH ROW EXECUTE FUNCTION comments_summary()")
+    else:
+        db.execute("ALTER TABLE tasks ADD COLUMN comment_count INTEGER NOT NULL DEFAULT 0")
+        db.execute("ALTER TABLE tasks ADD COLUMN last_comment_id INTEGER")
+        db.execute("ALTER TABLE tasks ADD COLUMN last_comment_at DATETIME")
+        db.execute("""
+            CREATE TRIGGER IF NOT EXISTS comments_summary_insert AFTER INSERT ON comments
+            BEGIN
+                UPDATE tasks SET comment_count = comment_count + 1,
+                    last_comment_id = NEW.id, last_comment_at = NEW.created_at
+                WHERE id = NEW.task_id;
+            END;
+        """)
+        db.execute("""
+            CREATE TRIGGER IF NOT EXISTS comments_summary_delete AFTER DELETE ON comments
+            BEGIN
+                UPDATE tasks SET comment_count = MAX(comment_count - 1, 0),
+                    last_comment_id = (SELECT MAX(id) FROM comments WHERE task_id = OLD.task_id),
+                    last_comment_at = (SELECT created_at FROM comments WHERE task_id = OLD.task_id ORDER BY id DESC LIMIT 1)
+                WHERE id = OLD.task_id;
+            END;
+        """)
+    # One-off backfill
+    db.execute("""
+        UPDATE tasks SET
+            comment_count = (SELECT COUNT(*) FROM comments c WHERE c.task_id = tasks.id),
+            last_comment_id = (SELECT MAX(c.id) FROM comments c WHERE c.task_id = tasks.id),
+            last_comment_at = (SELECT c.created_at FROM comments c WHERE c.task_id = tasks.id ORDER BY c.id DESC LIMIT 1)
+        WHERE EXISTS (SELECT 1 FROM comments c WHERE c.task_id = tasks.id)
+    """)
+
+def _m007_full_text_search(db):
+    # One search document per task: title (weight A), description (B) and
+    # the text of its comments (C), kept in sync by triggers
+    if db.is_postgres:
+        db.execute("ALTER TABLE tasks ADD COLUMN IF NOT EXISTS search_vector tsvector")
+        db.execute("""
+            CREATE OR REPLACE FUNCTION task_search_vector(p_task_id INTEGER, p_title TEXT, p_description TEXT)
+            RETURNS tsvector AS $$
+                SELECT setweight(to_tsvector('simple', coalesce(p_title, '')), 'A')
+                    || setweight(to_tsvector('simple', coalesce(p_description, '')), 'B')
+                    || setweight(to_tsvector('simple', coalesce(
+                        (SELECT string_agg(content, ' ') FROM comments WHERE task_id = p_task_id), '')), 'C')
+            $$ LANGUAGE sql STABLE;
+        """)
+        db.execute("""
+            CREATE OR REPLACE FUNCTION tasks_search_refresh() RETURNS trigger AS $$
+            BEGIN
+                NEW.search_vector := task_search_vector(NEW.id, NEW.title, NEW.description);
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql;
+        """)
+        db.execute("""
+            CREATE OR REPLACE FUNCTION comments_search_refresh() RETURNS trigger AS $$
+            DECLARE
+                target INTEGER := CASE WHEN TG_OP = 'DELETE' THEN OLD.task_id ELSE NEW.task_id END;
+            BEGIN
+                UPDATE tasks SET search_vector = task_search_vector(id, title, description) WHERE id = target;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql;
+        """)
+        db.execute("DROP TRIGGER IF EXISTS tasks_search ON tasks")
+        db.execute("CREATE TRIGGER tasks_search BEFORE INSERT OR UPDATE OF title, description ON tasks FOR EACH ROW EXECUTE FUNCTION tasks_search_refresh()")
+        db.execute("DROP TRIGGER IF EXISTS comments_search ON comments")
+        db.execute("CREATE TRIGGER comments_search AFTER INSERT OR DELETE ON comments FOR EACH ROW EXECUTE FUNCTION comments_search_refresh()")
+        db.execute("UPDATE tasks SET search_vector = task_search_vector(id, title, description)")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_tasks_search ON tasks USING GIN (search_vector)")
+        return
+
+    db.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+            title, description, comments, tokenize = 'unicode61 remove_diacritics 2'
+        )
+    """)
+    comments_of = "(SELECT group_concat(content, ' ') FROM comments WHERE task_id = {})"
+    db.execute("""
+        CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks
+        BEGIN
+            INSERT INTO tasks_fts (rowid, title, description, comments)
+            VALUES (NEW.id, NEW.title, coalesce(NEW.description, ''), '');
+        END;
+    """)
+    db.execute("""
+        CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF title, description ON tasks
+        BEGIN
+            UPDATE tasks_fts SET title = NEW.title, description = coalesce(NEW.description, '')
+            WHERE rowid = NEW.id;
+        END;
+    """)
+    db.execute("""
+        CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks
+        BEGIN
+            DELETE FROM tasks_fts WHERE rowid = OLD.id;
+        END;
+    """)
+    db.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS comments_fts_insert AFTER INSERT ON comments
+        BEGIN
+            UPDATE tasks_fts SET comments = coalesce({comments_of.format('NEW.task_id')}, '')
+            WHERE rowid = NEW.task_id;
+        END;
+    """)
+    db.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS comments_fts_delete AFTER DELETE ON comments
+        BEGIN
+            UPDATE tasks_fts SET comments = coalesce({comments_of.format('OLD.task_id')}, '')
+            WHERE rowid = OLD.task_id;
+        END;
+    """)
+    db.execute("DELETE FROM tasks_fts")
+    db.execute(f"""
+        INSERT INTO tasks_fts (rowid, title, description, comments)
+        SELECT t.id, t.title, coalesce(t.description, ''), coalesce({comments_of.format('t.id')}, '')
+        FROM tasks t
+    """)
+
+def _m008_tasks_summary_indexes(db):
+    # api_tasks_summary: one branch per visibility index, answered from the index alone
+    db.execute("CREATE INDEX IF NOT EXISTS idx_tasks_user_summary ON tasks (user_id, status, priority, due_date, created_by)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_tasks_creator_summary ON tasks (created_by, status, priority, due_date, user_id)")
+
+def _m009_typed_due_dates(db):
+    # Free-form text -> ISO dates (NULL when empty or unreadable); on Postgres
+    # the column then becomes a real DATE. ISO text sorts correctly on SQLite.
+    # Unreadable values are logged, so they can be re-entered by hand.
+    fixes = []
+    for row in db.execute('SELECT id, due_date FROM tasks WHERE due_date IS NOT NULL').fetchall():
+        raw = str(row['due_date'])
+        try:
+            iso = parse_due_date(raw)
+        except ValueError:
+            app.logger.warning("Migration 9: task %s due date %r is not a date, cleared", row['id'], raw)
+            iso = None
+        if iso != raw:
+            fixes.append((iso, row['id']))
+    if fixes:
+        db.executemany('UPDATE tasks SET due_date = ? WHERE id = ?', fixes)
+    if db.is_postgres:
+        column = db.execute(
+            "SELECT data_type FROM information_schema.columns WHERE table_name = 'tasks' AND column_name = 'due_date'"
+        ).fetchone()
+        if column['data_type'] != 'date':
+            db.execute("ALTER TABLE tasks ALTER COLUMN due_date TYPE DATE USING due_date::date")
+    # api_tasks_due: range scans per visibility branch
+    db.execute("CREATE INDEX IF NOT EXISTS idx_tasks_user_due ON tasks (user_id, due_date)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_tasks_creator_due ON tasks (created_by, due_date)")
+
+def _m010_task_archive(db):
+    # completed_at drives archival. The completion time of tasks that are
+    # already Completed is unknown, so their clock starts now.
+    if db.is_postgres:
+        db.execute("ALTER TABLE tasks ADD COLUMN IF NOT EXISTS completed_at TIMESTAMP")
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS archived_tasks (
+                id INTEGER PRIMARY KEY,
+                title TEXT NOT NULL,
+                description TEXT,
+                status TEXT,
+                priority TEXT,
+                due_date DATE,
+                user_id INTEGER,
+                created_by INTEGER,
+                created_at TIMESTAMP,
+                completed_at TIMESTAMP,
+                comment_count INTEGER NOT NULL DEFAULT 0,
+                archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS archived_comments (
+                id INTEGER PRIMARY KEY,
+                task_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                content TEXT NOT NULL,
+                created_at TIMESTAMP,
+                FOREIGN KEY(task_id) REFERENCES archived_tasks(id) ON DELETE CASCADE,
+                FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+            );
+        """)
+    else:
+        db.execute("ALTER TABLE tasks ADD COLUMN completed_at DATETIME")
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS archived_tasks (
+                id INTEGER PRIMARY KEY,
+                title TEXT NOT NULL,
+                description TEXT,
+                status TEXT,
+                priority TEXT,
+                due_date TEXT,
+                user_id INTEGER,
+                created_by INTEGER,
+                created_at DATETIME,
+                completed_at DATETIME,
+                comment_count INTEGER NOT NULL DEFAULT 0,
+                archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS archived_comments (
+                id INTEGER PRIMARY KEY,
+                task_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                content TEXT NOT NULL,
+                created_at DATETIME,
+                FOREIGN KEY(task_id) REFERENCES archived_tasks(id) ON DELETE CASCADE,
+                FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+            );
+        """)
+    db.execute("UPDATE tasks SET completed_at = CURRENT_TIMESTAMP WHERE status = 'Completed'")
+    # archive_batch: oldest completions first, only Completed rows indexed
+    db.execute("CREATE INDEX IF NOT EXISTS idx_tasks_completed_at ON tasks (completed_at, id) WHERE status = 'Completed'")
+    # api_archive_list: same shape as the hot list, ordered by completion
+    db.execute("CREATE INDEX IF NOT EXISTS idx_archived_tasks_user ON archived_tasks (user_id, completed_at DESC, id DESC)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_archived_tasks_creator ON archived_tasks (created_by, completed_at DESC, id DESC)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_archived_comments_task ON archived_comments (task_id, created_at, id)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_archived_comments_user ON archived_comments (user_id)")
+
+def _m011_unique_login_key(db):
+    # Signup checks then inserts: only a unique index stops two concurrent
+    # signups with the same normalized name. Older duplicates keep the oldest
+    # row on the key; the others sign in by their exact spelling (api_signin).
+    db.execute('''
+        UPDATE users SET login_key = NULL
+        WHERE login_key IS NOT NULL
+          AND id > (SELECT MIN(u.id) FROM users u WHERE u.login_key = users.login_key)
+    ''')
+    db.execute("DROP INDEX IF EXISTS idx_users_login_key")
+    db.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_login_key ON users (login_key)")
+
+# Advisory lock key space (first key of the two-int form) for in-flight revisions
+SYNC_LOCK_SPACE = 0x706C6E72
+
+def _m012_sync_rev_sequence(db):
+    # Postgres only. Migration 4 bumps a single sync_state row, so every
+    # writer queues on its row lock, bulk jobs for their whole transaction.
+    # Revisions now come from a sequence instead, which hands them out
+    # without waiting, but no longer in commit order: a reader could see 11
+    # committed while 10 is still in flight, then never be sent 10.
+    # Before its first nextval a transaction takes a shared advisory lock on
+    # the sequence's last_value (<= every revision it will get, with the
+    # default CACHE 1); visible_sync_rev() serves the last revision handed
+    # out, capped below the lowest of those locks. Reading last_value before
+    # pg_locks means any revision it covers already has its lock in place.
+    # SQLite serializes writers anyway and keeps the counter row.
+    if not db.is_postgres:
+        return
+    db.execute("CREATE SEQUENCE IF NOT EXISTS sync_rev_seq AS BIGINT")
+    db.execute("SELECT setval('sync_rev_seq', rev) FROM sync_state WHERE rev > 0")
+    db.execute(f"""
+        CREATE OR REPLACE FUNCTION bump_sync_rev() RETURNS BIGINT AS $$
+        BEGIN
+            IF current_setting('planner.sync_writer', true) IS DISTINCT FROM '1' THEN
+                PERFORM pg_advisory_xact_lock_shared({SYNC_LOCK_SPACE}, (SELECT last_value FROM sync_rev_seq)::integer);
+                PERFORM set_config('planner.sync_writer', '1', true);
+            END IF;
+            RETURN nextval('sync_rev_seq');
+        END
+        $$ LANGUAGE plpgsql;
+    """)
+    db.execute(f"""
+        CREATE OR REPLACE FUNCTION visible_sync_rev() RETURNS BIGINT AS $$
+        DECLARE
+            latest BIGINT;
+            pending BIGINT;
+        BEGIN
+            SELECT CASE WHEN is_called THEN last_value ELSE last_value - 1 END INTO latest FROM sync_rev_seq;
+            SELECT MIN(objid::bigint) INTO pending FROM pg_locks
+            WHERE locktype = 'advisory' AND classid = {SYNC_LOCK_SPACE} AND objsubid = 2
+              AND database = (SELECT oid FROM pg_database WHERE datname = current_database());
+            RETURN LEAST(latest, pending - 1);
+        END
+        $$ LANGUAGE plpgsql;
+    """)
+    db.execute("DROP TABLE IF EXISTS sync_state")
+
+MIGRATIONS = [
+    (1, 'base schema', _m001_base_schema),
+    (2, 'tasks columns', _m002_tasks_columns),
+    (3, 'hot path indexes', _m003_hot_path_indexes),
+    (4, 'change tracking', _m004_change_tracking),
+    (5, 'users login key', _m005_users_login_key),
+    (6, 'tasks comment summary', _m006_tasks_comment_summary),
+    (7, 'full text search', _m007_full_text_search),
+    (8, 'tasks summary indexes', _m008_tasks_summary_indexes),
+    (9, 'typed due dates', _m009_typed_due_dates),
+    (10, 'task archive', _m010_task_archive),
+    (11, 'unique login key', _m011_unique_login_key),
+    (12, 'sync rev sequence', _m012_sync_rev_sequence),
+]
+
+def schema_version(db):
+    row = db.execute('SELECT MAX(version) AS version FROM schema_migrations').fetchone()
+    return row['version'] or 0
+
+def migrate(db):
+    """Apply pending migrations; return the list of versions applied."""
+    # Common case (every cold start): schema already current, one query, no DDL
+    try:
+        if schema_version(db) >= MIGRATIONS[-1][0]:
+            db.commit()
+            return []
+    except Exception:
+        db.rollback()
+
+    if db.is_postgres:
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+    else:
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
     db.commit()
 
+    if schema_version(db) >= MIGRATIONS[-1][0]:
+        return []
+
+    applied = []
+    for version, name, step in MIGRATIONS:
+        # Serialize concurrent workers, then re-check under the lock
+        if db.is_postgres:
+            db.execute('SELECT pg_advisory_xact_lock(?)', (MIGRATION_LOCK_ID,))
+        else:
+            db.execute('BEGIN IMMEDIATE')
+        if schema_version(db) >= version:
+            db.commit()
+            continue
+        try:
+            step(db)
+            db.execute('INSERT INTO schema_migrations (version, name) VALUES (?, ?)', (version, name))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        applied.append(version)
+    if applied:
+        PreparedStatements.invalidate_all()
+    return applied
+
+_schema_checked = False
+_schema_lock = threading.Lock()
+
+def ensure_schema(db):
+    """Run migrations once per process (startup / first connection)."""
+    global _schema_checked
+    if _schema_checked:
+        return
+    with _schema_lock:
+        if _schema_checked:
+            return
+        try:
+            applied = migrate(db)
+        except Exception:
+            # Leave _schema_checked unset: this request fails, the next one retries
+            app.logger.exception("DB migration failed")
+            raise
+        if applied:
+            app.logger.info("DB migrations applied: %s", applied)
+        _schema_checked = True
+
+def init_db():
+    db = get_db()
+    return migrate(db)
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Apply pending database migrations."""
+    applied = init_db()
+    click.echo(f"Schema version {schema_version(get_db())}, applied: {applied or 'nessuna'}")
+
 @app.teardown_appcontext
 def close_connection(exception):
-    db = getattr(g, '_database', None)
+    db = g.pop('_database', None)
     if db is not None:
-        db.close()
+        # Connection errors mean the socket is likely dead: don't put it back
+        db.close(discard=isinstance(exception, DB_DISCONNECT_ERRORS))
+
+def make_etag(*parts):
+    """Weak per-user validator derived from cheap version data (revisions, counts)."""
+    raw = ':'.join(str(p) for p in (session.get('user_id'),) + parts)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20]
+
+def not_modified(etag):
+    """Return a 304 response if the client already holds ``etag``, else None."""
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+    return None
+
+def with_etag(response, etag):
+    response.set_etag(etag, weak=True)
+    return response
+
+# Static assets
+#
+# Templates reference assets through static_url(), which appends a content
+# hash (?v=<hash>). Requests carrying the current hash are cacheable for a
+# year; precompressed .br/.gz files (see `flask --app app compress-static`)
+# are served when the client accepts them and they are up to date.
+
+STATIC_MAX_AGE = 31536000
+STATIC_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+_asset_hashes = {}
+
+def asset_hash(filename):
+    path = safe_join(app.static_folder, filename)
+    if path is None:
+        return None
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    cached = _asset_hashes.get(filename)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:12]
+    _asset_hashes[filename] = (mtime, digest)
+    return digest
+
+@app.template_global()
+def static_url(filename):
+    return url_for('static', filename=filename, v=asset_hash(filename))
+
+def send_static_asset(filename):
+    source = safe_join(app.static_folder, filename)
+    if source is not None and os.path.isfile(source):
+        source_mtime = os.stat(source).st_mtime
+        for encoding, suffix in STATIC_ENCODINGS:
+            if not request.accept_encodings[encoding]:
+                continue
+            variant = source + suffix
+            if os.path.isfile(variant) and os.stat(variant).st_mtime >= source_mtime:
+                response = send_from_directory(
+                    app.static_folder, filename + suffix,
+                    mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+                )
+                response.headers['Content-Encoding'] = encoding
+                response.vary.add('Accept-Encoding')
+                return response
+    return app.send_static_file(filename)
+
+app.view_functions['static'] = send_static_asset
+
+@app.cli.command('compress-static')
+def compress_static_command():
+    """Write .gz (and .br, if brotli is installed) next to each static asset."""
+    count = 0
+    for root, _, files in os.walk(app.static_folder):
+        for name in files:
+            if name.endswith(('.gz', '.br')):
+                continue
+            path = os.path.join(root, name)
+            with open(path, 'rb') as f:
+                data = f.read()
+            with open(path + '.gz', 'wb') as f:
+                f.write(gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                with open(path + '.br', 'wb') as f:
+                    f.write(brotli.compress(data, quality=11))
+            count += 1
+    click.echo(f"Compressi {count} file statici" + ("" if brotli else " (solo gzip: modulo brotli non installato)"))
+
+# Live updates (Server-Sent Events)
+#
+# Mutations emit events inside their transaction; subscribers of the users
+# concerned (assignee and creator) receive them once it commits. The memory
+# broker only reaches streams served by the same process; the postgres broker
+# goes through NOTIFY/LISTEN so every worker sees every event. Event ids are
+# sync revisions, so a reconnecting client is caught up with collect_changes().
+# On Vercel streams are off by default (EVENTS=0): a serverless invocation per
+# open tab, and instances can't reach each other's subscribers. /api/events
+# then answers 204, which stops EventSource, and the client polls
+# /api/tasks/changes instead.
+
+EVENTS_ENABLED = os.environ.get('EVENTS', '0' if os.environ.get('VERCEL') else '1') != '0'
+EVENTS_BROKER = os.environ.get('EVENTS_BROKER', 'postgres' if IS_POSTGRES else 'memory')
+EVENTS_CHANNEL = 'planner_events'
+EVENTS_KEEPALIVE = float(os.environ.get('EVENTS_KEEPALIVE', '15'))
+EVENTS_MAX_AGE = float(os.environ.get('EVENTS_MAX_AGE', '300'))
+EVENTS_QUEUE_SIZE = 100
+NOTIFY_MAX_PAYLOAD = 7900  # Postgres limit is 8000 bytes
+
+class MemoryBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # user_id -> set of queues
+
+    def subscribe(self, user_id):
+        q = queue.Queue(maxsize=EVENTS_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(q)
+        return q
+
+    def unsubscribe(self, user_id, q):
+        with self._lock:
+            queues = self._subscribers.get(user_id)
+            if queues is not None:
+                queues.discard(q)
+                if not queues:
+                    del self._subscribers[user_id]
+
+    def emit(self, db, event):
+        db.after_commit(lambda: self.publish(event))
+
+    def publish(self, event):
+        with self._lock:
+            targets = [q for uid in set(event['recipients']) for q in self._subscribers.get(uid, ())]
+        for q in targets:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                # Slow consumer: drop its backlog and ask it to resync
+                with q.mutex:
+                    q.queue.clear()
+                q.put_nowait({'id': event['id'], 'type': 'resync', 'recipients': event['recipients'], 'data': {}})
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(v) for v in self._subscribers.values())
+
+class PostgresBroker(MemoryBroker):
+    def __init__(self, dsn):
+        super().__init__()
+        self._dsn = dsn
+        self._listener = None
+
+    def subscribe(self, user_id):
+        self._ensure_listener()
+        return super().subscribe(user_id)
+
+    def emit(self, db, event):
+        payload = json.dumps(event, default=str)
+        if len(payload.encode('utf-8')) > NOTIFY_MAX_PAYLOAD:
+            # Too big for NOTIFY: send the envelope, clients fetch the delta
+            payload = json.dumps(dict(event, data={'task_id': event['data'].get('task_id')}))
+        db.execute('SELECT pg_notify(?, ?)', (EVENTS_CHANNEL, payload))
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name='events-listener', daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        pg_listen(self._dsn, EVENTS_CHANNEL, self._on_notify)
+
+    def _on_notify(self, payload):
+        try:
+            self.publish(json.loads(payload))
+        except ValueError:
+            pass
+
+def pg_listen(dsn, channel, handle):
+    """LISTEN on ``channel`` forever, calling ``handle(payload)`` per notification.
+
+    Runs in a daemon thread; reconnects with backoff on errors.
+    """
+    backoff = 1
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(dsn)
+            conn.autocommit = True
+            conn.cursor().execute(f'LISTEN {channel}')
+            backoff = 1
+            while True:
+                if select.select([conn], [], [], EVENTS_KEEPALIVE) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    handle(conn.notifies.pop(0).payload)
+        except Exception as e:
+            app.logger.warning("Listener error (%s): %s", channel, e)
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+        finally:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+if EVENTS_BROKER == 'postgres' and IS_POSTGRES:
+    broker = PostgresBroker(DATABASE_URL)
+else:
+    broker = MemoryBroker()
+
+def emit_event(db, event_type, recipients, data, rev=None):
+    """Queue a live event; call inside the write transaction, before commit.
+
+    The event id is a lower bound for Last-Event-ID catch-up: ``rev`` is the
+    revision the write returned (see returned_rev), otherwise it is looked up.
+    """
+    if not EVENTS_ENABLED:
+        return
+    event = {
+        'id': current_rev(db) if rev is None else rev,
+        'type': event_type,
+        'recipients': [uid for uid in recipients if uid is not None],
+        'data': data,
+    }
+    broker.emit(db, event)
+
+def returned_rev(db, row):
+    # Postgres stamps rev in a BEFORE trigger, so RETURNING carries it (for a
+    # DELETE, the row's last revision: lower than its tombstone, still a safe
+    # resume point). SQLite stamps it in AFTER triggers RETURNING cannot see.
+    return row['rev'] if db.is_postgres else None
+
+def format_sse(event_type, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return '\n'.join(lines) + '\n\n'
+
+# Request metrics
+#
+# Every request records its latency, the time spent in DBWrapper (connection
+# setup and queries), the number of queries and the JSON serialization time.
+# Histograms are kept per route in process memory and exposed in Prometheus
+# text format at /metrics; each response also carries a Server-Timing header.
+# Queries slower than SLOW_QUERY_MS are logged with their normalized SQL.
+
+METRICS_ENABLED = os.environ.get('METRICS', '1') != '0'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '1') != '0'
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '200'))
+SLOW_QUERY_LOG_SIZE = 100
+SLOW_QUERY_MAX_DISTINCT = 200
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+HISTOGRAMS = {
+    'planner_request_duration_seconds': ('Request latency', LATENCY_BUCKETS),
+    'planner_request_db_seconds': ('Time spent connecting to and querying the database per request', LATENCY_BUCKETS),
+    'planner_request_json_seconds': ('Time spent serializing JSON per request', LATENCY_BUCKETS),
+    'planner_request_queries': ('Database queries per request', (0, 1, 2, 3, 5, 10, 20, 50, 100)),
+}
+COUNTERS = {
+    'planner_requests_total': 'Requests by route, method and status',
+    'planner_slow_queries_total': 'Queries slower than SLOW_QUERY_MS, by normalized SQL',
+    'planner_slow_queries_seconds_total': 'Total time spent in slow queries, by normalized SQL',
+    'planner_tasks_archived_total': 'Completed tasks moved to the archive',
+}
+
+_SQL_STRING = re.compile(r"'(?:[^']|'')*'")
+_SQL_NUMBER = re.compile(r'(?<![\w$])\d+(?:\.\d+)?\b')
+_SQL_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+
+@functools.lru_cache(maxsize=256)
+def normalize_sql(query):
+    """Collapse whitespace, literals and placeholder lists so equal queries group together."""
+    sql = _SQL_STRING.sub('?', ' '.join(query.split()))
+    sql = _SQL_NUMBER.sub('?', sql)
+    return _SQL_LIST.sub('(...)', sql)[:500]
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_label_value(v)}"' for k, v in labels) + '}'
+
+class Metrics:
+    """Process-local counters and histograms, rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+        self._counters = {}    # (name, labels) -> value
+        self._slow_sql = set()
+        self.slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+
+    def observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name][1]
+        key = (name, tuple(labels.items()))
+        with self._lock:
+            data = self._histograms.get(key)
+            if data is None:
+                data = self._histograms[key] = [0] * (len(buckets) + 2)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    data[i] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def inc(self, name, labels, amount=1):
+        key = (name, tuple(labels.items()))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def slow_query(self, query, elapsed):
+        sql = normalize_sql(query)
+        route = request_route() if has_request_context() else None
+        app.logger.warning("Slow query (%.1f ms, %s): %s", elapsed * 1000, route or 'no request', sql)
+        with self._lock:
+            self.slow_queries.append({
+                'sql': sql,
+                'ms': round(elapsed * 1000, 3),
+                'route': route,
+                'at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            })
+            # Keep the label set bounded even if SQL is built dynamically
+            if sql not in self._slow_sql:
+                if len(self._slow_sql) >= SLOW_QUERY_MAX_DISTINCT:
+                    sql = 'other'
+                else:
+                    self._slow_sql.add(sql)
+        self.inc('planner_slow_queries_total', {'sql': sql})
+        self.inc('planner_slow_queries_seconds_total', {'sql': sql}, elapsed)
+
+    def render(self):
+        with self._lock:
+            histograms = {key: list(data) for key, data in self._histograms.items()}
+            counters = dict(self._counters)
+        lines = []
+        for name, (help_text, buckets) in HISTOGRAMS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for (metric, labels), data in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                # observe() counts a value in every bucket it fits, so counts are cumulative
+                for bound, count in zip(buckets, data):
+                    lines.append(f'{name}_bucket{_format_labels(labels + (("le", bound),))} {count}')
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {data[-1]}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {data[-2]:.6f}')
+                lines.append(f'{name}_count{_format_labels(labels)} {data[-1]}')
+        for name, help_text in COUNTERS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_format_labels(labels)} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+
+def request_route():
+    # The URL rule, not the path, keeps label cardinality bounded
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+def json_default(value):
+    # Timestamps go out as str(), e.g. "2026-10-18 09:30:00", not Flask's RFC 822 dates
+    if isinstance(value, (datetime.date, datetime.time)):
+        return str(value)
+    return DefaultJSONProvider.default(value)
+
+def dumps_json(obj):
+    """Serialize ``obj`` to compact UTF-8 JSON bytes, with orjson when installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=json_default,
+                            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=json_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+class PlannerJSONProvider(DefaultJSONProvider):
+    """jsonify() through dumps_json, timed for Server-Timing."""
+
+    default = staticmethod(json_default)
+
+    def response(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            obj = self._prepare_response_obj(args, kwargs)
+            return self._app.response_class(dumps_json(obj) + b'\n', mimetype=self.mimetype)
+        finally:
+            if has_request_context():
+                g._json_time = g.get('_json_time', 0.0) + time.perf_counter() - started
+
+app.json = PlannerJSONProvider(app)
+
+@app.before_request
+def start_request_timer():
+    g._request_started = time.perf_counter()
+
+def observe_request(route, method, status, total, db, json_time):
+    if METRICS_ENABLED:
+        metrics.inc('planner_requests_total', {'route': route, 'method': method, 'status': status})
+        metrics.observe('planner_request_duration_seconds', {'route': route, 'method': method}, total)
+        metrics.observe('planner_request_db_seconds', {'route': route},
+                        db.connect_time + db.query_time if db is not None else 0.0)
+        metrics.observe('planner_request_json_seconds', {'route': route}, json_time)
+        metrics.observe('planner_request_queries', {'route': route}, db.query_count if db is not None else 0)
+    if _first_response is None:
+        record_first_response(total, method, route)
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get('_request_started')
+    if started is None:
+        return response
+    db = g.get('_database')
+    route = request_route()
+    method = request.method
+
+    if response.is_streamed:
+        # The body, and the queries it runs, are produced after this hook:
+        # observe the request when the stream is closed. The headers are gone
+        # by then, so streamed responses carry no Server-Timing.
+        status = response.status_code
+        response.call_on_close(
+            lambda: observe_request(route, method, status, time.perf_counter() - started, db, 0.0))
+        return response
+
+    total = time.perf_counter() - started
+    connect_time = db.connect_time if db is not None else 0.0
+    query_time = db.query_time if db is not None else 0.0
+    query_count = db.query_count if db is not None else 0
+    json_time = g.get('_json_time', 0.0)
+    first = _first_response is None
+    observe_request(route, method, response.status_code, total, db, json_time)
+
+    if SERVER_TIMING:
+        timings = []
+        if first:
+            timings.append(f"startup;dur={(_startup_marks[-1][1] - _startup_marks[0][1]) * 1000:.2f}")
+        if db is not None:
+            timings.append(f'conn;dur={connect_time * 1000:.2f}')
+            timings.append(f'db;dur={query_time * 1000:.2f};desc="{query_count} queries"')
+        if json_time:
+            timings.append(f'json;dur={json_time * 1000:.2f}')
+        if g.get('_compress_time'):
+            timings.append(f"compress;dur={g._compress_time * 1000:.2f}")
+        timings.append(f'total;dur={total * 1000:.2f}')
+        response.headers['Server-Timing'] = ', '.join(timings)
+    return response
+
+# Cold start
+#
+# On serverless hosts every cold start pays for the imports, the first DB
+# connection and the schema check before answering. Backend drivers and
+# codecs are imported only when used; with FAST_STARTUP (default on Vercel)
+# the connection is opened, the schema checked and the user cache loaded
+# while the module loads, so the first request does none of it. The pool is
+# module-level and survives across warm invocations.
+
+FAST_STARTUP = os.environ.get('FAST_STARTUP', '1' if os.environ.get('VERCEL') else '0') != '0'
+_first_response = None
+
+def startup_report():
+    """Seconds spent in each startup phase, up to the end of the first request."""
+    report = {name: at - previous for (_, previous), (name, at) in zip(_startup_marks, _startup_marks[1:])}
+    if _first_response is not None:
+        report['first_request'] = _first_response
+    report['total'] = _startup_marks[-1][1] - _startup_marks[0][1] + (_first_response or 0.0)
+    return report
+
+def record_first_response(duration, method, route):
+    global _first_response
+    _first_response = duration
+    phases = ', '.join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in startup_report().items())
+    app.logger.info("Cold start (%s %s): %s", method, route, phases)
+
+def warm_up():
+    """Connect, check the schema and load the user cache at import time (FAST_STARTUP)."""
+    try:
+        with app.app_context():
+            get_db()
+            user_directory.users()
+    except Exception as e:
+        # Nothing is lost: the first request connects and migrates as usual
+        app.logger.warning("Warm-up error: %s", e)
+
+@app.get('/metrics')
+def metrics_endpoint():
+    if not METRICS_ENABLED:
+        return jsonify({"error": "Metriche disabilitate"}), 404
+    if METRICS_TOKEN:
+        if request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+            return jsonify({"error": "Token non valido"}), 401
+    elif not session.get('app_unlocked'):
+        return jsonify({"error": "App bloccata. Inserire password."}), 403
+    body = metrics.render()
+    if IS_POSTGRES and _pg_pool is not None:
+        lines = ['# TYPE planner_db_pool gauge']
+        lines += [f'planner_db_pool{{stat="{k}"}} {v}' for k, v in sorted(_pg_pool.stats().items())]
+        body += '\n'.join(lines) + '\n'
+    elif not IS_POSTGRES:
+        lines = ['# TYPE planner_db_pool gauge']
+        lines += [f'planner_db_pool{{stat="{k}"}} {v}' for k, v in sorted(sqlite_connections.stats().items())
+                  if isinstance(v, (int, float))]
+        body += '\n'.join(lines) + '\n'
+    if not IS_POSTGRES and sqlite_connections.write_queue is not None:
+        lines = ['# TYPE planner_sqlite_write_queue gauge']
+        lines += [f'planner_sqlite_write_queue{{stat="{k}"}} {float(v):g}'
+                  for k, v in sorted(sqlite_connections.write_queue.stats().items())]
+        body += '\n'.join(lines) + '\n'
+    lines = ['# TYPE planner_startup_seconds gauge']
+    lines += [f'planner_startup_seconds{{phase="{k}"}} {v:.6f}' for k, v in startup_report().items()]
+    body += '\n'.join(lines) + '\n'
+    body += '# TYPE planner_sse_subscribers gauge\n'
+    body += f'planner_sse_subscribers {broker.subscriber_count()}\n'
+    return Response(body, mimetype='text/plain; version=0.0.4')
 
 @app.before_request
 def check_app_lock():
@@ -169,8 +1944,8 @@ def check_app_lock():
     if request.path.startswith('/static/'):
         return None
     
-    # Allow unlock endpoint
-    if request.path == '/api/unlock':
+    # Allow unlock endpoint; /metrics and the cron endpoint check their own token
+    if request.path in ('/api/unlock', '/metrics', '/api/archive/run'):
         return None
         
     # Check if app is unlocked
@@ -202,13 +1977,6 @@ def api_unlock():
 
 @app.post('/api/signup')
 def api_signup():
-    # Ensure DB is initialized (create tables if not exist)
-    try:
-        init_db()
-    except Exception as e:
-        print(f"DB Init Error: {e}")
-        # Continue, maybe it's just a connection glitch or already exists issue that will be caught later
-    
     data = request.get_json(silent=True) or {}
     full_name = (data.get('fullName') or '').strip()
     pwd = (data.get('password') or '')
@@ -238,15 +2006,21 @@ def api_signup():
     if not IS_POSTGRES and os.environ.get('VERCEL'):
         return jsonify({"error": "Configurazione Errata: DATABASE_URL mancante su Vercel"}), 500
 
+    key = login_key(f"{first} {last}")
     pwd_hash = generate_password_hash(pwd)
     try:
         db = get_db()
+        # Names differing only by case/spacing would make sign-in ambiguous;
+        # the unique index on login_key settles concurrent signups (409 below)
+        if db.execute('SELECT 1 FROM users WHERE login_key = ?', (key,)).fetchone():
+            return jsonify({"error": "Utente già esistente"}), 409
         db.execute(
-            'INSERT INTO users (first_name, last_name, password_hash) VALUES (?, ?, ?)',
-            (first, last, pwd_hash)
+            'INSERT INTO users (first_name, last_name, password_hash, login_key) VALUES (?, ?, ?, ?)',
+            (first, last, pwd_hash, key)
         )
+        user_directory.changed(db)
         db.commit()
-    except (sqlite3.IntegrityError, psycopg2.IntegrityError):
+    except DB_INTEGRITY_ERRORS:
         return jsonify({"error": "Utente già esistente"}), 409
     except Exception as e:
         return jsonify({"error": f"Errore Database: {str(e)}"}), 500
@@ -264,23 +2038,25 @@ def api_signin():
     if not pwd:
         return jsonify({"error": "La password è obbligatoria"}), 400
 
-    db = get_db()
-    row = None
-    
     if full_name:
-        row = db.execute(
-            "SELECT id, first_name, last_name, password_hash FROM users WHERE (first_name || ' ' || last_name) = ?",
-            (full_name,)
-        ).fetchone()
+        typed = full_name
     elif first and last:
-        row = db.execute(
-            'SELECT id, first_name, last_name, password_hash FROM users WHERE first_name=? AND last_name=?',
-            (first, last)
-        ).fetchone()
+        typed = f"{first} {last}"
     else:
         return jsonify({"error": "Nome utente (Nome Cognome) obbligatorio"}), 400
 
-    if not row or not check_password_hash(row['password_hash'], pwd):
+    db = get_db()
+    # Duplicates predating the unique key have none (migration 11): exact spelling
+    candidates = db.execute(
+        '''SELECT id, first_name, last_name, password_hash FROM users
+           WHERE login_key = ? OR (login_key IS NULL AND first_name || ' ' || last_name = ?)''',
+        (login_key(typed), typed)
+    ).fetchall()
+    # Try the exact spelling first
+    candidates.sort(key=lambda r: f"{r['first_name']} {r['last_name']}" != typed)
+    row = next((r for r in candidates if check_password_hash(r['password_hash'], pwd)), None)
+
+    if not row:
         return jsonify({"error": "Credenziali non valide"}), 401
 
     session['user_id'] = row['id']
@@ -298,14 +2074,90 @@ def api_session():
         return jsonify({"authenticated": True, "user": session.get('user_name'), "user_id": session.get('user_id')})
     return jsonify({"authenticated": False})
 
+# User directory
+#
+# The user list is small and only changes on signup and user deletion, so
+# each process keeps it in memory. Those endpoints invalidate the local copy
+# on commit; other workers pick the change up after USER_CACHE_TTL seconds,
+# or right away with USER_CACHE_BACKEND=postgres (NOTIFY on change, one
+# LISTEN thread per process). A user's name never changes, so task rows take
+# assigned_to_name from here instead of joining users.
+
+USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', '60'))
+USER_CACHE_BACKEND = os.environ.get('USER_CACHE_BACKEND', 'memory')
+USER_CACHE_MISS_RELOAD = float(os.environ.get('USER_CACHE_MISS_RELOAD', '5'))
+USERS_CHANNEL = 'planner_users'
+
+class UserDirectory:
+    def __init__(self, shared_dsn=None):
+        self._lock = threading.Lock()
+        self._snapshot = None  # (loaded_at, version, users, names, unknown ids)
+        self._shared_dsn = shared_dsn
+        self._listener = None
+
+    def users(self):
+        """Return (version, [{"id", "name"}, ...]) sorted by name."""
+        snapshot = self._current()
+        return snapshot[1], snapshot[2]
+
+    def name(self, user_id):
+        if user_id is None:
+            return None
+        snapshot = self._current()
+        name = snapshot[3].get(user_id)
+        if name is None and user_id not in snapshot[4]:
+            # Maybe signed up on another worker: reload, but at most once per
+            # USER_CACHE_MISS_RELOAD seconds. Ids still unknown (deleted users,
+            # arbitrary assignTo values) are remembered until the next reload.
+            if time.monotonic() - snapshot[0] > USER_CACHE_MISS_RELOAD:
+                snapshot = self._load(snapshot)
+                name = snapshot[3].get(user_id)
+            if name is None:
+                snapshot[4].add(user_id)
+        return name
+
+    def changed(self, db):
+        """Call inside the transaction that inserts or deletes users."""
+        db.after_commit(self.invalidate)
+        if self._shared_dsn:
+            db.execute('SELECT pg_notify(?, ?)', (USERS_CHANNEL, ''))
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def _current(self):
+        snapshot = self._snapshot
+        if snapshot is None or time.monotonic() - snapshot[0] > USER_CACHE_TTL:
+            snapshot = self._load(snapshot)
+        return snapshot
+
+    def _load(self, stale):
+        with self._lock:
+            if self._snapshot is not None and self._snapshot is not stale:
+                return self._snapshot  # reloaded by another thread meanwhile
+            if self._shared_dsn and (self._listener is None or not self._listener.is_alive()):
+                self._listener = threading.Thread(
+                    target=pg_listen, args=(self._shared_dsn, USERS_CHANNEL, lambda payload: self.invalidate()),
+                    name='users-listener', daemon=True)
+                self._listener.start()
+            rows = get_db().execute('SELECT id, first_name, last_name FROM users ORDER BY first_name, last_name').fetchall()
+            users = [{"id": row["id"], "name": f"{row['first_name']} {row['last_name']}"} for row in rows]
+            version = hashlib.sha1(json.dumps(users).encode('utf-8')).hexdigest()[:16]
+            self._snapshot = (time.monotonic(), version, users, {u['id']: u['name'] for u in users}, set())
+            return self._snapshot
+
+user_directory = UserDirectory(DATABASE_URL if USER_CACHE_BACKEND == 'postgres' and IS_POSTGRES else None)
+
 @app.get('/api/users')
 def api_users_list():
     if 'user_id' not in session:
         return jsonify({"users": []})
-    db = get_db()
-    rows = db.execute('SELECT id, first_name, last_name FROM users ORDER BY first_name, last_name').fetchall()
-    users = [{"id": row["id"], "name": f"{row['first_name']} {row['last_name']}"} for row in rows]
-    return jsonify({"users": users})
+    version, users = user_directory.users()
+    etag = make_etag('users', version)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    return with_etag(jsonify({"users": users}), etag)
 
 @app.delete('/api/users/<int:user_id>')
 def api_users_delete(user_id):
@@ -325,150 +2177,619 @@ def api_users_delete(user_id):
         
     try:
         db.execute('DELETE FROM users WHERE id = ?', (user_id,))
+        user_directory.changed(db)
         db.commit()
     except Exception as e:
         return jsonify({"error": str(e)}), 500
         
     return jsonify({"message": "Utente cancellato con successo"}), 200
 
-@app.get('/api/tasks')
-def api_tasks_list():
+@app.get('/api/db/pool')
+def api_db_pool():
+    if 'user_id' not in session:
+        return jsonify({"error": "Autenticazione richiesta"}), 401
+    statements = translate_sql.cache_info()._asdict()
+    slow_queries = list(metrics.slow_queries)
+    if not IS_POSTGRES:
+        return jsonify({"pool": sqlite_connections.stats(), "statements": statements, "slow_queries": slow_queries})
+    prepared = getattr(get_db().conn, 'prepared', None)
+    statements['prepared_on_connection'] = len(prepared) if prepared is not None else 0
+    return jsonify({"pool": get_pg_pool().stats(), "statements": statements, "slow_queries": slow_queries})
+
+TASKS_PAGE_MAX = int(os.environ.get('TASKS_PAGE_MAX', '200'))
+TASKS_PAGE_COMMENTS = int(os.environ.get('TASKS_PAGE_COMMENTS', '5'))
+
+def encode_cursor(created_at, task_id):
+    raw = f"{created_at}|{task_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        created_at, task_id = raw.rsplit('|', 1)
+        # A tampered timestamp would otherwise fail in the database (500 on Postgres)
+        datetime.datetime.fromisoformat(created_at)
+        return created_at, int(task_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def task_dict(row):
+    """Row -> task dict; Postgres timestamps are turned into strings by json_default."""
+    task = dict(row)
+    task.pop('rev', None)
+    task['assigned_to_name'] = user_directory.name(task['user_id'])
+    return task
+
+def load_comments(db, task_ids, per_task=None, table='comments'):
+    """Return {task_id: [comment, ...]} for the given tasks.
+
+    ``per_task=None`` loads every comment; otherwise only the latest
+    ``per_task`` comments of each task are materialized. Totals live in
+    tasks.comment_count. ``table='archived_comments'`` reads archived tasks.
+    """
+    comments_map = {}
+    if not task_ids or per_task == 0:
+        return comments_map
+    placeholders = ','.join(['?'] * len(task_ids))
+
+    if per_task is None:
+        comments_query = f"""
+            SELECT c.task_id, c.id, c.content, c.created_at, u.first_name, u.last_name
+            FROM {table} c
+            JOIN users u ON c.user_id = u.id
+            WHERE c.task_id IN ({placeholders})
+            ORDER BY c.created_at ASC
+        """
+        params = list(task_ids)
+    else:
+        comments_query = f"""
+            SELECT task_id, id, content, created_at, first_name, last_name
+            FROM (
+                SELECT c.task_id, c.id, c.content, c.created_at, u.first_name, u.last_name,
+                    ROW_NUMBER() OVER (PARTITION BY c.task_id ORDER BY c.created_at DESC, c.id DESC) AS rn
+                FROM {table} c
+                JOIN users u ON c.user_id = u.id
+                WHERE c.task_id IN ({placeholders})
+            ) latest
+            WHERE rn <= ?
+            ORDER BY task_id, created_at ASC, id ASC
+        """
+        params = list(task_ids) + [per_task]
+
+    for row in db.execute(comments_query, params).fetchall():
+        tid = row['task_id']
+        if tid not in comments_map:
+            comments_map[tid] = []
+        comments_map[tid].append({
+            "id": row["id"],
+            "content": row["content"],
+            "created_at": row["created_at"],
+            "user_name": f"{row['first_name']} {row['last_name']}"
+        })
+    return comments_map
+
+def comments_per_task(default):
+    """The ?comments= argument: 'all' -> None, N -> latest N, absent -> ``default``."""
+    comments_arg = request.args.get('comments')
+    if comments_arg is None:
+        return default
+    if comments_arg == 'all':
+        return None
+    return max(int(comments_arg), 0)
+
+TASKS_STREAM = os.environ.get('TASKS_STREAM', '1') != '0'
+TASKS_STREAM_BATCH = int(os.environ.get('TASKS_STREAM_BATCH', '500'))
+
+def stream_tasks(db, query, params, per_task, rev):
+    """Response writing {"rev": ..., "tasks": [...]} one batch of rows at a time.
+
+    Comments are loaded per batch, so memory stays bounded by
+    TASKS_STREAM_BATCH tasks whatever the size of the list.
+    """
+    def generate():
+        yield b'{"rev":' + dumps_json(rev) + b',"tasks":['
+        separator = b''
+        for rows in db.iterate(query, params, TASKS_STREAM_BATCH):
+            tasks = [task_dict(row) for row in rows]
+            comments_map = load_comments(db, [t['id'] for t in tasks], per_task)
+            for t in tasks:
+                t['comments'] = comments_map.get(t['id'], [])
+            yield separator + b','.join(dumps_json(t) for t in tasks)
+            separator = b','
+        yield b']}\n'
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+@app.get('/api/tasks')
+def api_tasks_list():
+    if 'user_id' not in session:
+        return jsonify({"tasks": []})
+    db = get_db()
+    uid = session['user_id']
+    # Read before the tasks so a concurrent write is re-sent, never missed
+    rev, version = read_revision(db)
+    etag = make_etag('tasks', version, sorted(request.args.items(multi=True)))
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+
+    # Paginated mode is opt-in (limit and/or cursor); without it the full list
+    # is returned as before.
+    limit_arg = request.args.get('limit')
+    cursor_arg = request.args.get('cursor')
+    paginated = limit_arg is not None or cursor_arg is not None
+
+    try:
+        per_task = comments_per_task(TASKS_PAGE_COMMENTS if paginated else None)
+    except ValueError:
+        return jsonify({"error": "Parametro 'comments' non valido"}), 400
+
+    columns = """t.id, t.title, t.description, t.status, t.priority, t.due_date, t.created_at, t.user_id, t.created_by,
+            t.comment_count, t.last_comment_id, t.last_comment_at"""
+    limit = None
+    if paginated:
+        try:
+            limit = int(limit_arg) if limit_arg is not None else TASKS_PAGE_MAX
+        except ValueError:
+            return jsonify({"error": "Parametro 'limit' non valido"}), 400
+        limit = min(max(limit, 1), TASKS_PAGE_MAX)
+        keyset = ''
+        position = []
+        if cursor_arg:
+            position = decode_cursor(cursor_arg)
+            if position is None:
+                return jsonify({"error": "Cursore non valido"}), 400
+            keyset = " AND (t.created_at, t.id) < (?, ?)"
+            position = list(position)
+        # Disjoint halves (assigned to me / created by me for someone else),
+        # each an ordered range scan of its own index stopping after one page;
+        # only the two short heads are merged. Fetch one extra row to know
+        # whether another page exists.
+        query = f"""
+            SELECT * FROM (
+                SELECT {columns} FROM tasks t
+                WHERE t.user_id = ?{keyset}
+                ORDER BY t.created_at DESC, t.id DESC LIMIT ?
+            ) AS assigned
+            UNION ALL
+            SELECT * FROM (
+                SELECT {columns} FROM tasks t
+                WHERE t.created_by = ? AND (t.user_id IS NULL OR t.user_id <> ?){keyset}
+                ORDER BY t.created_at DESC, t.id DESC LIMIT ?
+            ) AS created
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        """
+        params = [uid] + position + [limit + 1] + [uid, uid] + position + [limit + 1, limit + 1]
+    else:
+        query = f"""
+            SELECT {columns}
+            FROM tasks t
+            WHERE (t.user_id = ? OR t.created_by = ?)
+            ORDER BY t.created_at DESC, t.id DESC
+        """
+        params = [uid, uid]
+        if TASKS_STREAM:
+            # Unbounded list: stream it instead of materializing every task
+            return with_etag(stream_tasks(db, query, params, per_task, rev), etag)
+    rows = db.execute(query, params).fetchall()
+    
+    tasks = [task_dict(row) for row in rows]
+    next_cursor = None
+    if limit is not None and len(tasks) > limit:
+        tasks = tasks[:limit]
+        next_cursor = encode_cursor(tasks[-1]['created_at'], tasks[-1]['id'])
+    
+    if tasks:
+        comments_map = load_comments(db, [t['id'] for t in tasks], per_task)
+        for t in tasks:
+            t['comments'] = comments_map.get(t['id'], [])
+
+    if paginated:
+        return with_etag(jsonify({"tasks": tasks, "next_cursor": next_cursor, "rev": rev}), etag)
+    return with_etag(jsonify({"tasks": tasks, "rev": rev}), etag)
+
+TASK_STATUSES = ('To Do', 'In Progress', 'Completed')
+TASK_PRIORITIES = ('Bassa', 'Media', 'Alta')
+
+@app.get('/api/tasks/summary')
+def api_tasks_summary():
+    """Board counters (status, priority, overdue, mine) for the visible tasks."""
+    if 'user_id' not in session:
+        return jsonify({"error": "Autenticazione richiesta"}), 401
+    today = request.args.get('today') or datetime.date.today().isoformat()
+    try:
+        today = datetime.date.fromisoformat(today).isoformat()
+    except ValueError:
+        return jsonify({"error": "Parametro 'today' non valido (AAAA-MM-GG)"}), 400
+    db = get_db()
+    uid = session['user_id']
+    rev, version = read_revision(db)
+    etag = make_etag('summary', version, today)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+
+    # Assigned to me, plus created by me for someone else: disjoint halves of
+    # the list visibility rule, each served by its own covering index
+    overdue = "SUM(CASE WHEN status <> 'Completed' AND due_date < ? THEN 1 ELSE 0 END)"
+    rows = db.execute(f'''
+        SELECT 1 AS assigned, CASE WHEN created_by = ? THEN 1 ELSE 0 END AS created,
+            status, priority, COUNT(*) AS n, {overdue} AS overdue
+        FROM tasks
+        WHERE user_id = ?
+        GROUP BY 2, 3, 4
+        UNION ALL
+        SELECT 0, 1, status, priority, COUNT(*), {overdue}
+        FROM tasks
+        WHERE created_by = ? AND (user_id IS NULL OR user_id <> ?)
+        GROUP BY 3, 4
+    ''', (uid, today, uid, today, uid, uid)).fetchall()
+
+    summary = {
+        "total": 0,
+        "by_status": dict.fromkeys(TASK_STATUSES, 0),
+        "by_priority": dict.fromkeys(TASK_PRIORITIES, 0),
+        "overdue": 0,
+        "assigned_to_me": 0,
+        "created_by_me": 0,
+    }
+    for row in rows:
+        n = int(row['n'])
+        summary['total'] += n
+        summary['by_status'][row['status']] = summary['by_status'].get(row['status'], 0) + n
+        summary['by_priority'][row['priority']] = summary['by_priority'].get(row['priority'], 0) + n
+        summary['overdue'] += int(row['overdue'] or 0)
+        if row['assigned']:
+            summary['assigned_to_me'] += n
+        if row['created']:
+            summary['created_by_me'] += n
+    summary.update(rev=rev, today=today)
+    return with_etag(jsonify(summary), etag)
+
+@app.get('/api/tasks/due')
+def api_tasks_due():
+    """Visible tasks due between ?from= and ?to= (inclusive, either may be omitted)."""
+    if 'user_id' not in session:
+        return jsonify({"error": "Autenticazione richiesta"}), 401
+    try:
+        date_from = parse_due_date(request.args.get('from'))
+        date_to = parse_due_date(request.args.get('to'))
+    except ValueError:
+        return jsonify({"error": "Date non valide (AAAA-MM-GG)"}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', TASKS_PAGE_MAX)), 1), TASKS_PAGE_MAX)
+        per_task = comments_per_task(TASKS_PAGE_COMMENTS)
+    except ValueError:
+        return jsonify({"error": "Parametri non validi"}), 400
+    include_completed = request.args.get('completed') == '1'
+    position = None
+    cursor_arg = request.args.get('cursor')
+    if cursor_arg:
+        position = decode_cursor(cursor_arg)
+        try:
+            datetime.date.fromisoformat(position[0])
+        except (TypeError, ValueError):
+            return jsonify({"error": "Cursore non valido"}), 400
+
+    db = get_db()
+    uid = session['user_id']
+    rev, version = read_revision(db)
+    etag = make_etag('due', version, sorted(request.args.items(multi=True)))
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+
+    conditions = ["t.due_date IS NOT NULL"]
+    range_params = []
+    if date_from:
+        conditions.append("t.due_date >= ?")
+        range_params.append(date_from)
+    if date_to:
+        conditions.append("t.due_date <= ?")
+        range_params.append(date_to)
+    if not include_completed:
+        conditions.append("t.status <> 'Completed'")
+    if position:
+        # Keyset on the sort order: resume after the last task of the previous page
+        conditions.append("(t.due_date, t.id) > (?, ?)")
+        range_params.extend(position)
+    where = ' AND '.join(conditions)
+    columns = """t.id, t.title, t.description, t.status, t.priority, t.due_date, t.created_at, t.user_id, t.created_by,
+            t.comment_count, t.last_comment_id, t.last_comment_at"""
+    # Same disjoint split as the summary, so each half is a (user, due_date) range scan
+    rows = db.execute(f'''
+        SELECT {columns} FROM tasks t WHERE t.user_id = ? AND {where}
+        UNION ALL
+        SELECT {columns} FROM tasks t WHERE t.created_by = ? AND (t.user_id IS NULL OR t.user_id <> ?) AND {where}
+        ORDER BY due_date, id
+        LIMIT ?
+    ''', [uid] + range_params + [uid, uid] + range_params + [limit + 1]).fetchall()
+
+    tasks = [task_dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(tasks[-1]['due_date'], tasks[-1]['id'])
+    if tasks:
+        comments_map = load_comments(db, [t['id'] for t in tasks], per_task)
+        for t in tasks:
+            t['comments'] = comments_map.get(t['id'], [])
+    return with_etag(jsonify({
+        "tasks": tasks,
+        "from": date_from,
+        "to": date_to,
+        "has_more": next_cursor is not None,
+        "next_cursor": next_cursor,
+        "rev": rev,
+    }), etag)
+
+def read_revision(db):
+    """Return (rev, version): the revision clients may resume from, and the
+    ETag part for responses read after it.
+
+    On Postgres rev can hold still behind an open transaction while later
+    ones commit (see _m012_sync_rev_sequence), so the version adds the
+    transaction snapshot, which changes whenever any writer commits.
+    """
+    if db.is_postgres:
+        row = db.execute('SELECT visible_sync_rev() AS rev, pg_current_snapshot()::text AS snapshot').fetchone()
+        return row['rev'], f"{row['rev']}:{row['snapshot']}"
+    row = db.execute('SELECT rev FROM sync_state WHERE id = 1').fetchone()
+    rev = row['rev'] if row else 0
+    return rev, rev
+
+def current_rev(db):
+    return read_revision(db)[0]
+
+@app.get('/api/tasks/changes')
+def api_tasks_changes():
+    if 'user_id' not in session:
+        return jsonify({"error": "Autenticazione richiesta"}), 401
+    try:
+        since = int(request.args.get('since', ''))
+    except ValueError:
+        return jsonify({"error": "Parametro 'since' obbligatorio"}), 400
+
+    return jsonify(collect_changes(get_db(), session['user_id'], since))
+
+@app.get('/api/events')
+def api_events():
+    if 'user_id' not in session:
+        return jsonify({"error": "Autenticazione richiesta"}), 401
+    if not EVENTS_ENABLED:
+        # 204 tells EventSource not to reconnect; the client falls back to polling
+        return Response(status=204)
+    uid = session['user_id']
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+
+    # Subscribe before reading the backlog so nothing falls in between
+    q = broker.subscribe(uid)
+    backlog = None
+    try:
+        db = get_db()
+        if last_id:
+            try:
+                backlog = collect_changes(db, uid, int(last_id))
+            except ValueError:
+                backlog = None
+        rev = backlog['rev'] if backlog else current_rev(db)
+    except Exception:
+        broker.unsubscribe(uid, q)
+        raise
+
+    def stream():
+        # No request/app context here: the DB connection has already been released
+        started = time.monotonic()
+        try:
+            yield 'retry: 3000\n\n'
+            if backlog is not None and (backlog['tasks'] or backlog['comments']
+                                        or backlog['deleted']['tasks'] or backlog['deleted']['comments']):
+                yield format_sse('changes', backlog, backlog['rev'])
+            else:
+                yield format_sse('ready', {'rev': rev}, rev)
+            while EVENTS_MAX_AGE <= 0 or time.monotonic() - started < EVENTS_MAX_AGE:
+                try:
+                    event = q.get(timeout=EVENTS_KEEPALIVE)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                yield format_sse(event['type'], event['data'], event['id'])
+        finally:
+            broker.unsubscribe(uid, q)
+
+    response = Response(stream(), mimetype='text/event-stream')
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def collect_changes(db, uid, since):
+    """Everything visible to ``uid`` that changed after revision ``since``."""
+    rev = current_rev(db)
+    if since >= rev:
+        return {"rev": rev, "tasks": [], "comments": [], "deleted": {"tasks": [], "comments": []}}
+
+    rows = db.execute('''
+        SELECT t.id, t.title, t.description, t.status, t.priority, t.due_date, t.created_at, t.user_id, t.created_by,
+            t.comment_count, t.last_comment_id, t.last_comment_at
+        FROM tasks t
+        WHERE t.rev > ? AND (t.user_id = ? OR t.created_by = ?)
+        ORDER BY t.created_at DESC, t.id DESC
+    ''', (since, uid, uid)).fetchall()
+    tasks = [task_dict(row) for row in rows]
+    # A changed task may be new to this client (e.g. just assigned to it), so
+    # it travels with its comments; other new comments are sent on their own.
+    comments_map = load_comments(db, [t['id'] for t in tasks])
+    for t in tasks:
+        t['comments'] = comments_map.get(t['id'], [])
+
+    changed_ids = {t['id'] for t in tasks}
+    comments = []
+    for r in db.execute('''
+        SELECT c.id, c.task_id, c.content, c.created_at, u.first_name, u.last_name
+        FROM comments c
+        JOIN tasks t ON c.task_id = t.id
+        JOIN users u ON c.user_id = u.id
+        WHERE c.rev > ? AND (t.user_id = ? OR t.created_by = ?)
+        ORDER BY c.created_at ASC, c.id ASC
+    ''', (since, uid, uid)).fetchall():
+        if r['task_id'] in changed_ids:
+            continue
+        comments.append({
+            "id": r["id"],
+            "task_id": r["task_id"],
+            "content": r["content"],
+            "created_at": str(r["created_at"]),
+            "user_name": f"{r['first_name']} {r['last_name']}"
+        })
+
+    # Tombstones of tasks the user could see, unless the task is still visible
+    # (e.g. a reassignment away from a user who is also the creator, or a
+    # task restored from the archive); the same for restored comments
+    deleted_tasks = [row['entity_id'] for row in db.execute('''
+        SELECT DISTINCT ts.entity_id
+        FROM tombstones ts
+        WHERE ts.entity = 'task' AND ts.rev > ? AND (ts.user_id = ? OR ts.created_by = ?)
+          AND NOT EXISTS (
+              SELECT 1 FROM tasks t WHERE t.id = ts.entity_id AND (t.user_id = ? OR t.created_by = ?)
+          )
+    ''', (since, uid, uid, uid, uid)).fetchall()]
+    deleted_comments = [row['entity_id'] for row in db.execute('''
+        SELECT ts.entity_id
+        FROM tombstones ts
+        JOIN tasks t ON ts.task_id = t.id
+        WHERE ts.entity = 'comment' AND ts.rev > ? AND (t.user_id = ? OR t.created_by = ?)
+          AND NOT EXISTS (SELECT 1 FROM comments c WHERE c.id = ts.entity_id)
+    ''', (since, uid, uid)).fetchall()]
+
+    return {
+        "rev": rev,
+        "tasks": tasks,
+        "comments": comments,
+        "deleted": {"tasks": deleted_tasks, "comments": deleted_comments},
+    }
+
+SEARCH_PAGE_MAX = int(os.environ.get('SEARCH_PAGE_MAX', '50'))
+SEARCH_MAX_TERMS = 10
+
+@app.get('/api/search')
+def api_search():
     if 'user_id' not in session:
-        return jsonify({"tasks": []})
+        return jsonify({"error": "Autenticazione richiesta"}), 401
+    terms = re.findall(r'\w+', request.args.get('q', ''))[:SEARCH_MAX_TERMS]
+    if not terms:
+        return jsonify({"error": "Parametro 'q' obbligatorio"}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), SEARCH_PAGE_MAX)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({"error": "Parametri di paginazione non validi"}), 400
+
     db = get_db()
-    
-    query = """
-        SELECT 
-            t.id, t.title, t.description, t.status, t.priority, t.due_date, t.created_at, t.user_id, t.created_by,
-            u.first_name || ' ' || u.last_name as assigned_to_name
-        FROM tasks t
-        LEFT JOIN users u ON t.user_id = u.id
-        WHERE t.user_id = ? OR t.created_by = ?
-        ORDER BY t.created_at DESC
+    uid = session['user_id']
+    columns = """t.id, t.title, t.description, t.status, t.priority, t.due_date, t.created_at, t.user_id, t.created_by,
+            t.comment_count, t.last_comment_id, t.last_comment_at"""
+    if db.is_postgres:
+        # Every term must match, as a prefix
+        rows = db.execute(f'''
+            SELECT {columns}, ts_rank(t.search_vector, q) AS score
+            FROM tasks t
+            CROSS JOIN to_tsquery('simple', ?) q
+            WHERE t.search_vector @@ q AND (t.user_id = ? OR t.created_by = ?)
+            ORDER BY score DESC, t.id DESC
+            LIMIT ? OFFSET ?
+        ''', (' & '.join(f"{term}:*" for term in terms), uid, uid, limit + 1, offset)).fetchall()
+    else:
+        # Column weights mirror the Postgres A/B/C setup; bm25 is lower-is-better
+        rows = db.execute(f'''
+            SELECT {columns}, -bm25(tasks_fts, 10.0, 4.0, 1.0) AS score
+            FROM tasks_fts
+            JOIN tasks t ON t.id = tasks_fts.rowid
+            WHERE tasks_fts MATCH ? AND (t.user_id = ? OR t.created_by = ?)
+            ORDER BY score DESC, t.id DESC
+            LIMIT ? OFFSET ?
+        ''', (' '.join(f'"{term}"*' for term in terms), uid, uid, limit + 1, offset)).fetchall()
+
+    results = [task_dict(row) for row in rows[:limit]]
+    for r in results:
+        r['score'] = round(float(r['score']), 6)
+    return jsonify({
+        "results": results,
+        "offset": offset,
+        "limit": limit,
+        "has_more": len(rows) > limit,
+    })
+
+def parse_due_date(value):
+    """Return the ISO date ('YYYY-MM-DD') for ``value``, or None if empty.
+
+    Accepts ISO dates and the dd/mm/yyyy form shown in the UI; raises
+    ValueError for anything else.
     """
-    rows = db.execute(query, (session['user_id'], session['user_id'])).fetchall()
-    
-    tasks = [dict(row) for row in rows]
-    
-    if tasks:
-        task_ids = [str(t['id']) for t in tasks]
-        placeholders = ','.join(['?'] * len(task_ids))
-        comments_query = f"""
-            SELECT c.task_id, c.id, c.content, c.created_at, u.first_name, u.last_name
-            FROM comments c
-            JOIN users u ON c.user_id = u.id
-            WHERE c.task_id IN ({placeholders})
-            ORDER BY c.created_at ASC
-        """
-        comments_rows = db.execute(comments_query, task_ids).fetchall()
-        
-        comments_map = {}
-        for row in comments_rows:
-            tid = row['task_id']
-            if tid not in comments_map:
-                comments_map[tid] = []
-            comments_map[tid].append({
-                "id": row["id"],
-                "content": row["content"],
-                "created_at": str(row["created_at"]), # Ensure string serialization for PG timestamps
-                "user_name": f"{row['first_name']} {row['last_name']}"
-            })
-            
-        for t in tasks:
-            t['comments'] = comments_map.get(t['id'], [])
-            # Also ensure task timestamps are strings
-            t['created_at'] = str(t['created_at'])
-            
-    return jsonify({"tasks": tasks})
+    value = str(value or '').strip()
+    if not value:
+        return None
+    if re.fullmatch(r'\d{2}/\d{2}/\d{4}', value):
+        day, month, year = value.split('/')
+        value = f"{year}-{month}-{day}"
+    if not re.fullmatch(r'\d{4}-\d{2}-\d{2}', value):
+        raise ValueError(value)
+    return datetime.date.fromisoformat(value).isoformat()
 
-@app.post('/api/tasks')
-def api_tasks_create():
-    if 'user_id' not in session:
-        return jsonify({"error": "Autenticazione richiesta"}), 401
-    data = request.get_json(silent=True) or {}
+def validate_new_task(data, user_id):
+    """Return (insert values, None) or (None, (message, status))."""
     title = (data.get('title') or '').strip()
     description = (data.get('description') or '').strip()
     status = (data.get('status') or '').strip()
     priority = (data.get('priority') or '').strip()
-    due_date = (data.get('dueDate') or '').strip()
     assign_to = data.get('assignTo')
 
     if not title:
-        return jsonify({"error": "Il nome task è obbligatorio"}), 400
+        return None, ("Il nome task è obbligatorio", 400)
     if status not in ("To Do", "ToDo", "todo"):
-        return jsonify({"error": "Stato non valido (usa 'To Do')"}), 400
+        return None, ("Stato non valido (usa 'To Do')", 400)
     if priority not in ("Bassa", "Media", "Alta"):
-        return jsonify({"error": "Priorità non valida"}), 400
+        return None, ("Priorità non valida", 400)
+    try:
+        due_date = parse_due_date(data.get('dueDate'))
+    except ValueError:
+        return None, ("Data di scadenza non valida", 400)
     
-    target_user_id = session['user_id']
+    target_user_id = user_id
     if assign_to:
         try:
             target_user_id = int(assign_to)
         except ValueError:
             pass
 
-    db = get_db()
-    
-    if db.is_postgres:
-        cur = db.execute(
-            'INSERT INTO tasks (title, description, status, priority, due_date, user_id, created_by) VALUES (?, ?, ?, ?, ?, ?, ?) RETURNING id',
-            (title, description, 'To Do', priority, due_date, target_user_id, session['user_id'])
-        )
-        new_id = cur.fetchone()['id']
-    else:
-        cur = db.execute(
-            'INSERT INTO tasks (title, description, status, priority, due_date, user_id, created_by) VALUES (?, ?, ?, ?, ?, ?, ?)',
-            (title, description, 'To Do', priority, due_date, target_user_id, session['user_id'])
-        )
-        new_id = cur.lastrowid
-        
-    db.commit()
-
-    row = db.execute(
-        '''SELECT t.id, t.title, t.description, t.status, t.priority, t.due_date, t.created_at, t.user_id, t.created_by,
-           u.first_name || ' ' || u.last_name as assigned_to_name
-           FROM tasks t 
-           LEFT JOIN users u ON t.user_id = u.id
-           WHERE t.id = ?''',
-           (new_id,)
-    ).fetchone()
-    
-    # Convert Row/RealDict to dict and handle date serialization
-    res_task = dict(row)
-    res_task['created_at'] = str(res_task['created_at'])
-    
-    return jsonify({"task": res_task}), 201
+    return (title, description, 'To Do', priority, due_date, target_user_id, user_id), None
 
-@app.put('/api/tasks/<int:task_id>')
-def api_tasks_update(task_id):
-    if 'user_id' not in session:
-        return jsonify({"error": "Autenticazione richiesta"}), 401
-    
-    db = get_db()
-    task = db.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
-    
-    if not task:
-        return jsonify({"error": "Task non trovata"}), 404
+def task_edit_denied(task, user_id, restricted):
+    """(message, status) if ``user_id`` may not make the edit to ``task``, else None.
 
-    current_user_id = session['user_id']
-    is_creator = (task['created_by'] == current_user_id)
-    is_assignee = (task['user_id'] == current_user_id)
+    The assignee may only change the status; ``restricted`` edits (any other
+    field) belong to the creator.
+    """
+    if task is None:
+        return ("Task non trovata", 404)
+    is_creator = (task['created_by'] == user_id)
+    if not (is_creator or task['user_id'] == user_id):
+        return ("Permessi insufficienti", 403)
+    if restricted and not is_creator:
+        return ("Solo chi ha creato la task può modificarne i dettagli", 403)
+    return None
 
-    if not (is_creator or is_assignee):
-        return jsonify({"error": "Permessi insufficienti"}), 403
+def task_update_fields(data):
+    """Build the SET clause for an edit.
 
-    data = request.get_json(silent=True) or {}
-    
+    Return (updates, params, restricted, error); ``error`` is None or
+    (message, status) and ``restricted`` is True when fields other than the
+    status are touched.
+    """
     status = data.get('status')
     title = data.get('title')
     description = data.get('description')
     priority = data.get('priority')
     due_date = data.get('dueDate')
     
-    updating_restricted_fields = (title is not None) or (description is not None) or (priority is not None) or (due_date is not None)
-    
-    if updating_restricted_fields and not is_creator:
-        return jsonify({"error": "Solo chi ha creato la task può modificarne i dettagli"}), 403
+    restricted = (title is not None) or (description is not None) or (priority is not None) or (due_date is not None)
 
     updates = []
     params = []
@@ -476,6 +2797,10 @@ def api_tasks_update(task_id):
     if status:
         updates.append("status = ?")
         params.append(status)
+        # Archival age counts from the most recent completion: leaving Completed
+        # clears completed_at, saving a Completed task again keeps it
+        updates.append("completed_at = CASE WHEN ? = 'Completed' THEN COALESCE(completed_at, CURRENT_TIMESTAMP) END")
+        params.append(status)
     if title:
         updates.append("title = ?")
         params.append(title.strip())
@@ -486,35 +2811,494 @@ def api_tasks_update(task_id):
         updates.append("priority = ?")
         params.append(priority)
     if due_date is not None:
+        try:
+            due_date = parse_due_date(due_date)
+        except ValueError:
+            return None, None, restricted, ("Data di scadenza non valida", 400)
         updates.append("due_date = ?")
         params.append(due_date)
-        
-    if not updates:
-        return jsonify({"message": "Nessuna modifica"}), 200
-        
-    params.append(task_id)
+    return updates, params, restricted, None
+
+def build_task_update(data, task, user_id):
+    """Check permissions for editing ``task`` and build its SET clause.
+
+    Return (updates, params, None) or (None, None, (message, status)).
+    """
+    updates, params, restricted, error = task_update_fields(data)
+    error = task_edit_denied(task, user_id, restricted) or error
+    if error:
+        return None, None, error
+    return updates, params, None
+
+# Task fields returned by the write endpoints straight from RETURNING (SQLite
+# 3.35+ / Postgres), so a mutation is a single statement
+TASK_RETURNING = """RETURNING id, title, description, status, priority, due_date, created_at, user_id, created_by,
+    comment_count, last_comment_id, last_comment_at, rev"""
+
+@app.post('/api/tasks')
+def api_tasks_create():
+    if 'user_id' not in session:
+        return jsonify({"error": "Autenticazione richiesta"}), 401
+    data = request.get_json(silent=True) or {}
+    values, error = validate_new_task(data, session['user_id'])
+    if error:
+        return jsonify({"error": error[0]}), error[1]
+
+    db = get_db()
+    row = db.execute(
+        f'''INSERT INTO tasks (title, description, status, priority, due_date, user_id, created_by)
+            VALUES (?, ?, ?, ?, ?, ?, ?) {TASK_RETURNING}''',
+        values
+    ).fetchone()
+    
+    # Convert Row/RealDict to dict and handle date serialization
+    res_task = task_dict(row)
+
+    emit_event(db, 'task-created', (res_task['user_id'], res_task['created_by']), {'task': res_task},
+               rev=returned_rev(db, row))
+    db.commit()
     
-    query = f"UPDATE tasks SET {', '.join(updates)} WHERE id = ?"
-    db.execute(query, params)
+    return jsonify({"task": res_task}), 201
+
+TASKS_BATCH_MAX = int(os.environ.get('TASKS_BATCH_MAX', '500'))
+
+def fetch_tasks_by_id(db, task_ids):
+    if not task_ids:
+        return {}
+    placeholders = ','.join(['?'] * len(task_ids))
+    rows = db.execute(
+        f'''SELECT t.id, t.title, t.description, t.status, t.priority, t.due_date, t.created_at, t.user_id, t.created_by,
+           t.comment_count, t.last_comment_id, t.last_comment_at
+           FROM tasks t
+           WHERE t.id IN ({placeholders})''',
+        list(task_ids)
+    ).fetchall()
+    return {row['id']: task_dict(row) for row in rows}
+
+@app.post('/api/tasks/batch')
+def api_tasks_batch():
+    if 'user_id' not in session:
+        return jsonify({"error": "Autenticazione richiesta"}), 401
+    data = request.get_json(silent=True) or {}
+    operations = data.get('operations')
+    atomic = bool(data.get('atomic'))
+    if not isinstance(operations, list) or not operations:
+        return jsonify({"error": "Nessuna operazione"}), 400
+    if len(operations) > TASKS_BATCH_MAX:
+        return jsonify({"error": f"Massimo {TASKS_BATCH_MAX} operazioni per batch"}), 400
+
+    uid = session['user_id']
+    results = [None] * len(operations)
+
+    def fail(index, message, status):
+        results[index] = {"index": index, "ok": False, "status": status, "error": message}
+
+    # Every existing task touched by the batch, loaded in one set-based query
+    seen = set()
+    target_ids = []
+    for index, op in enumerate(operations):
+        if not isinstance(op, dict):
+            fail(index, "Operazione non valida", 400)
+            continue
+        if op.get('op') in ('update', 'delete'):
+            try:
+                task_id = int(op.get('id'))
+            except (TypeError, ValueError):
+                fail(index, "Id task non valido", 400)
+                continue
+            if task_id in seen:
+                fail(index, "Task presente più volte nel batch", 409)
+                continue
+            seen.add(task_id)
+            target_ids.append(task_id)
+
+    db = get_db()
+    existing = {}
+    if target_ids:
+        placeholders = ','.join(['?'] * len(target_ids))
+        for row in db.execute(
+            f'SELECT id, user_id, created_by FROM tasks WHERE id IN ({placeholders})', target_ids
+        ).fetchall():
+            existing[row['id']] = row
+
+    creates = []                # (index, values)
+    update_groups = {}          # SET clause -> [(index, task_id, params)]
+    deletes = []                # (index, task_id)
+    for index, op in enumerate(operations):
+        if results[index] is not None:
+            continue
+        kind = op.get('op')
+        if kind == 'create':
+            values, error = validate_new_task(op, uid)
+            if error:
+                fail(index, *error)
+            else:
+                creates.append((index, values))
+        elif kind in ('update', 'delete'):
+            task_id = int(op['id'])
+            task = existing.get(task_id)
+            if task is None:
+                fail(index, "Task non trovata", 404)
+            elif kind == 'delete':
+                if task['created_by'] != uid:
+                    fail(index, "Solo chi ha creato la task può cancellarla", 403)
+                else:
+                    deletes.append((index, task_id))
+            else:
+                updates, params, error = build_task_update(op, task, uid)
+                if error:
+                    fail(index, *error)
+                elif not updates:
+                    results[index] = {"index": index, "ok": True, "status": 200, "id": task_id, "message": "Nessuna modifica"}
+                else:
+                    update_groups.setdefault(', '.join(updates), []).append((index, task_id, params))
+        else:
+            fail(index, "Operazione sconosciuta (usa create, update o delete)", 400)
+
+    failed = [r for r in results if r is not None and not r['ok']]
+    if atomic and failed:
+        for index, r in enumerate(results):
+            if r is None:
+                results[index] = {"index": index, "ok": False, "status": 424, "error": "Non eseguita: batch annullato"}
+        return jsonify({"results": results, "applied": False}), 400
+
+    created_ids = db.insert_returning(
+        'tasks', ('title', 'description', 'status', 'priority', 'due_date', 'user_id', 'created_by'),
+        [values for _, values in creates]
+    )
+
+    for set_clause, items in update_groups.items():
+        db.executemany(
+            f"UPDATE tasks SET {set_clause} WHERE id = ?",
+            [params + [task_id] for _, task_id, params in items]
+        )
+    if deletes:
+        db.executemany('DELETE FROM tasks WHERE id = ?', [(task_id,) for _, task_id in deletes])
+
+    updated_ids = [task_id for items in update_groups.values() for _, task_id, _ in items]
+    tasks = fetch_tasks_by_id(db, created_ids + updated_ids)
+    for (index, _), task_id in zip(creates, created_ids):
+        results[index] = {"index": index, "ok": True, "status": 201, "id": task_id, "task": tasks.get(task_id)}
+    for items in update_groups.values():
+        for index, task_id, _ in items:
+            results[index] = {"index": index, "ok": True, "status": 200, "id": task_id, "task": tasks.get(task_id)}
+    for index, task_id in deletes:
+        results[index] = {"index": index, "ok": True, "status": 200, "id": task_id}
+
+    deleted_ids = [task_id for _, task_id in deletes]
+    if created_ids or updated_ids or deleted_ids:
+        recipients = {uid}
+        recipients.update(t['user_id'] for t in tasks.values())
+        recipients.update(existing[task_id]['user_id'] for task_id in deleted_ids)
+        emit_event(db, 'tasks-batch', recipients, {
+            'created': created_ids, 'updated': updated_ids, 'deleted': deleted_ids,
+        })
+    db.commit()
+
+    return jsonify({"results": results, "applied": True}), 200
+
+# Bulk export / import
+#
+# /api/export streams the caller's visible tasks, oldest first, with their
+# comments: NDJSON (one task per line) or CSV (comments as a JSON column).
+# /api/import reads the same formats from the request body, validates each
+# record and loads IMPORT_BATCH tasks per transaction. Task ids are reserved
+# up front, so tasks and their comments go in with DBWrapper.bulk_insert
+# (executemany on SQLite, COPY on Postgres). The response streams one NDJSON
+# progress line per committed batch; after a failure, send the same file
+# again with ?skip=<resume_from> to continue.
+
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+EXPORT_CSV_FIELDS = ('id', 'title', 'description', 'status', 'priority', 'due_date', 'created_at',
+                     'completed_at', 'assigned_to', 'created_by', 'comments')
+IMPORT_BATCH = int(os.environ.get('IMPORT_BATCH', '500'))
+IMPORT_MAX_ERRORS = 100
+
+def export_record(task, comments):
+    return {
+        'id': task['id'],
+        'title': task['title'],
+        'description': task['description'] or '',
+        'status': task['status'],
+        'priority': task['priority'],
+        'due_date': task['due_date'] or '',
+        'created_at': str(task['created_at']),
+        'completed_at': str(task['completed_at'] or ''),
+        'assigned_to': task['assigned_to_name'],
+        'created_by': user_directory.name(task['created_by']),
+        'comments': [
+            {'content': c['content'], 'created_at': str(c['created_at']), 'user_name': c['user_name']}
+            for c in comments
+        ],
+    }
+
+@app.get('/api/export')
+def api_export():
+    if 'user_id' not in session:
+        return jsonify({"error": "Autenticazione richiesta"}), 401
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": "Formato non supportato (ndjson o csv)"}), 400
+    db = get_db()
+    uid = session['user_id']
+    # Archived tasks are part of the export too, so it stays a complete backup
+    query = """
+        SELECT t.id, t.title, t.description, t.status, t.priority, t.due_date, t.created_at, t.user_id, t.created_by,
+            t.completed_at, 0 AS archived
+        FROM tasks t
+        WHERE t.user_id = ? OR t.created_by = ?
+        UNION ALL
+        SELECT a.id, a.title, a.description, a.status, a.priority, a.due_date, a.created_at, a.user_id, a.created_by,
+            a.completed_at, 1 AS archived
+        FROM archived_tasks a
+        WHERE a.user_id = ? OR a.created_by = ?
+        ORDER BY created_at, id
+    """
+
+    def generate():
+        if fmt == 'csv':
+            yield (','.join(EXPORT_CSV_FIELDS) + '\r\n').encode('utf-8')
+        for rows in db.iterate(query, (uid, uid, uid, uid), TASKS_STREAM_BATCH):
+            tasks = [task_dict(row) for row in rows]
+            comments_map = load_comments(db, [t['id'] for t in tasks if not t['archived']])
+            comments_map.update(load_comments(db, [t['id'] for t in tasks if t['archived']], table='archived_comments'))
+            records = [export_record(t, comments_map.get(t['id'], [])) for t in tasks]
+            if fmt == 'ndjson':
+                yield b''.join(dumps_json(r) + b'\n' for r in records)
+            else:
+                buf = io.StringIO()
+                writer = csv.writer(buf)
+                for r in records:
+                    r['comments'] = dumps_json(r['comments']).decode('utf-8')
+                    writer.writerow([r[field] for field in EXPORT_CSV_FIELDS])
+                yield buf.getvalue().encode('utf-8')
+
+    filename = f"planner-export-{datetime.date.today().isoformat()}.{fmt}"
+    response = Response(stream_with_context(generate()), mimetype=EXPORT_FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def read_import_records(stream, fmt):
+    """Yield (record number, dict or error message) without reading the whole body."""
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    if fmt == 'csv':
+        for number, row in enumerate(csv.DictReader(text), 1):
+            try:
+                row['comments'] = json.loads(row.get('comments') or '[]')
+            except ValueError:
+                yield number, "Colonna 'comments' non valida"
+                continue
+            yield number, row
+        return
+    number = 0
+    for line in text:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield number, "JSON non valido"
+            continue
+        yield number, record if isinstance(record, dict) else "Il record deve essere un oggetto"
+
+def import_timestamp(value):
+    """Normalize an exported timestamp to 'YYYY-MM-DD HH:MM:SS' (UTC); now if missing."""
+    if value:
+        parsed = datetime.datetime.fromisoformat(str(value))
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    else:
+        parsed = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed.strftime('%Y-%m-%d %H:%M:%S')
+
+def validate_import_record(record, uid, users_by_key):
+    """Return ((task values, comments), None) or (None, message)."""
+    title = str(record.get('title') or '').strip()
+    if not title:
+        return None, "Titolo mancante"
+    status = record.get('status') or 'To Do'
+    if status not in TASK_STATUSES:
+        return None, f"Stato non valido: {status}"
+    priority = record.get('priority') or 'Media'
+    if priority not in TASK_PRIORITIES:
+        return None, f"Priorità non valida: {priority}"
+    try:
+        due_date = parse_due_date(record.get('due_date'))
+        created_at = import_timestamp(record.get('created_at'))
+    except ValueError:
+        return None, "Data non valida"
+    assignee = users_by_key.get(login_key(str(record.get('assigned_to') or '')), uid)
+
+    comments = record.get('comments') or []
+    if not isinstance(comments, list):
+        return None, "'comments' deve essere una lista"
+    comment_values = []
+    for comment in comments:
+        content = str((comment or {}).get('content') or '').strip() if isinstance(comment, dict) else ''
+        if not content:
+            return None, "Commento senza testo"
+        try:
+            comment_created = import_timestamp(comment.get('created_at'))
+        except ValueError:
+            return None, "Data commento non valida"
+        author = users_by_key.get(login_key(str(comment.get('user_name') or '')), uid)
+        comment_values.append((author, content, comment_created))
+    try:
+        completed_at = import_timestamp(record.get('completed_at')) if status == 'Completed' else None
+    except ValueError:
+        return None, "Data non valida"
+    task = (title, str(record.get('description') or ''), status, priority, due_date, assignee, uid, created_at,
+            completed_at)
+    return (task, comment_values), None
+
+def reserve_task_ids(db, count):
+    if db.is_postgres:
+        rows = db.execute(
+            "SELECT nextval(pg_get_serial_sequence('tasks', 'id')) AS id FROM generate_series(1, CAST(? AS INTEGER))",
+            (count,)
+        ).fetchall()
+        return [row['id'] for row in rows]
+    # AUTOINCREMENT hands out max(sqlite_sequence, max id) + 1; the caller
+    # holds the write lock (BEGIN IMMEDIATE) so nobody else takes these
+    row = db.execute("""
+        SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'tasks'), 0),
+                   COALESCE((SELECT MAX(id) FROM tasks), 0)) AS last
+    """).fetchone()
+    return list(range(row['last'] + 1, row['last'] + 1 + count))
+
+def import_batch(db, batch, uid):
+    """Insert a batch of validated records in one transaction; return the new task ids."""
+    if not db.is_postgres:
+        db.execute('BEGIN IMMEDIATE')
+    ids = reserve_task_ids(db, len(batch))
+    db.bulk_insert(
+        'tasks',
+        ('id', 'title', 'description', 'status', 'priority', 'due_date', 'user_id', 'created_by', 'created_at',
+         'completed_at'),
+        [(task_id,) + task for task_id, (task, _) in zip(ids, batch)]
+    )
+    db.bulk_insert(
+        'comments',
+        ('task_id', 'user_id', 'content', 'created_at'),
+        [(task_id,) + comment for task_id, (_, comments) in zip(ids, batch) for comment in comments]
+    )
+    recipients = {uid}
+    recipients.update(task[5] for task, _ in batch)
+    emit_event(db, 'tasks-batch', recipients, {'created': ids, 'updated': [], 'deleted': []})
     db.commit()
+    return ids
+
+@app.post('/api/import')
+def api_import():
+    if 'user_id' not in session:
+        return jsonify({"error": "Autenticazione richiesta"}), 401
+    fmt = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": "Formato non supportato (ndjson o csv)"}), 400
+    try:
+        skip = max(int(request.args.get('skip', 0)), 0)
+    except ValueError:
+        return jsonify({"error": "Parametro 'skip' non valido"}), 400
+    db = get_db()
+    uid = session['user_id']
+    stream = request.stream
+    users_by_key = {login_key(u['name']): u['id'] for u in user_directory.users()[1]}
+
+    def generate():
+        progress = {'imported': 0, 'comments': 0, 'invalid': 0, 'resume_from': skip}
+        batch = []
+        last = skip
+
+        def flush():
+            """Commit the pending batch; return an error line if it failed."""
+            try:
+                import_batch(db, batch, uid)
+            except Exception as e:
+                db.rollback()
+                return dumps_json(dict(progress, error=f"Errore Database: {e}")) + b'\n'
+            progress['imported'] += len(batch)
+            progress['comments'] += sum(len(comments) for _, comments in batch)
+            progress['resume_from'] = last
+            batch.clear()
+            return None
+
+        for number, record in read_import_records(stream, fmt):
+            if number <= skip:
+                continue
+            last = number
+            if isinstance(record, str):
+                values, error = None, record
+            else:
+                values, error = validate_import_record(record, uid, users_by_key)
+            if error:
+                progress['invalid'] += 1
+                yield dumps_json({'record': number, 'error': error}) + b'\n'
+                if progress['invalid'] >= IMPORT_MAX_ERRORS:
+                    yield dumps_json(dict(progress, error="Troppi record non validi, importazione interrotta")) + b'\n'
+                    return
+                continue
+            batch.append(values)
+            if len(batch) >= IMPORT_BATCH:
+                failed = flush()
+                if failed:
+                    yield failed
+                    return
+                yield dumps_json(progress) + b'\n'
+        if batch:
+            failed = flush()
+            if failed:
+                yield failed
+                return
+        progress['resume_from'] = last
+        yield dumps_json(dict(progress, done=True)) + b'\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.put('/api/tasks/<int:task_id>')
+def api_tasks_update(task_id):
+    if 'user_id' not in session:
+        return jsonify({"error": "Autenticazione richiesta"}), 401
     
+    db = get_db()
+    uid = session['user_id']
+    data = request.get_json(silent=True) or {}
+    updates, params, restricted, error = task_update_fields(data)
+
+    if error or not updates:
+        # Nothing to write: just report what the caller may do with the task
+        task = db.execute('SELECT user_id, created_by FROM tasks WHERE id = ?', (task_id,)).fetchone()
+        error = task_edit_denied(task, uid, restricted) or error
+        if error:
+            return jsonify({"error": error[0]}), error[1]
+        return jsonify({"message": "Nessuna modifica"}), 200
+
+    # The permission check is part of the UPDATE (see task_edit_denied)
+    if restricted:
+        allowed, allowed_params = "created_by = ?", [uid]
+    else:
+        allowed, allowed_params = "(created_by = ? OR user_id = ?)", [uid, uid]
     updated_task = db.execute(
-        '''SELECT t.id, t.title, t.description, t.status, t.priority, t.due_date, t.created_at, t.user_id, t.created_by,
-           u.first_name || ' ' || u.last_name as assigned_to_name,
-           last_c.content as last_comment,
-           last_u.first_name || ' ' || last_u.last_name as last_comment_user
-           FROM tasks t 
-           LEFT JOIN users u ON t.user_id = u.id
-           LEFT JOIN comments last_c ON last_c.id = (
-                SELECT MAX(id) FROM comments WHERE task_id = t.id
-           )
-           LEFT JOIN users last_u ON last_c.user_id = last_u.id
-           WHERE t.id = ?''', 
-        (task_id,)
+        f'''UPDATE tasks SET {', '.join(updates)} WHERE id = ? AND {allowed}
+            {TASK_RETURNING},
+            (SELECT c.content FROM comments c WHERE c.id = tasks.last_comment_id) AS last_comment,
+            (SELECT u.first_name || ' ' || u.last_name FROM comments c JOIN users u ON c.user_id = u.id
+             WHERE c.id = tasks.last_comment_id) AS last_comment_user''',
+        params + [task_id] + allowed_params
     ).fetchone()
-    
-    res_task = dict(updated_task)
-    res_task['created_at'] = str(res_task['created_at'])
+
+    if updated_task is None:
+        # Only on failure: find out whether the task is missing or not ours
+        db.rollback()
+        task = db.execute('SELECT user_id, created_by FROM tasks WHERE id = ?', (task_id,)).fetchone()
+        error = task_edit_denied(task, uid, restricted) or ("Task non trovata", 404)
+        return jsonify({"error": error[0]}), error[1]
+
+    res_task = task_dict(updated_task)
+
+    emit_event(db, 'task-updated', (res_task['user_id'], res_task['created_by']), {'task': res_task},
+               rev=returned_rev(db, updated_task))
+    db.commit()
     
     return jsonify({"message": "Task aggiornata", "task": res_task}), 200
 
@@ -524,27 +3308,340 @@ def api_tasks_delete(task_id):
         return jsonify({"error": "Autenticazione richiesta"}), 401
         
     db = get_db()
-    result = db.execute(
-        'DELETE FROM tasks WHERE id = ? AND created_by = ?', 
+    deleted = db.execute(
+        f'DELETE FROM tasks WHERE id = ? AND created_by = ? {TASK_RETURNING}', 
         (task_id, session['user_id'])
-    )
+    ).fetchone()
+    if deleted:
+        emit_event(db, 'task-deleted', (deleted['user_id'], deleted['created_by']), {'task_id': task_id},
+                   rev=returned_rev(db, deleted))
     db.commit()
     
-    if result.rowcount == 0:
+    if not deleted:
+        # Only on failure: tell a missing task from someone else's
         task = db.execute('SELECT id FROM tasks WHERE id = ?', (task_id,)).fetchone()
         if task:
             return jsonify({"error": "Solo chi ha creato la task può cancellarla"}), 403
         return jsonify({"error": "Task non trovata"}), 404
         
-    return jsonify({"message": "Task eliminata"}), 200
+    return jsonify({"message": "Task eliminata", "task": task_dict(deleted)}), 200
+
+# Archival (hot/cold split)
+#
+# Tasks completed more than ARCHIVE_AFTER_DAYS ago move, with their comments,
+# to archived_tasks / archived_comments, ARCHIVE_BATCH tasks per transaction.
+# The board, sync, search and summary queries only ever see the hot tables;
+# /api/archive browses the cold ones and restores single tasks. Archiving
+# deletes from tasks, so clients get ordinary tombstones / tasks-batch events.
+# Runs from `flask --app app archive`, from /api/archive/run (Vercel Cron) or
+# from a background thread every ARCHIVE_INTERVAL seconds.
+
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', '30'))
+ARCHIVE_BATCH = int(os.environ.get('ARCHIVE_BATCH', '200'))
+ARCHIVE_INTERVAL = int(os.environ.get('ARCHIVE_INTERVAL', '0' if os.environ.get('VERCEL') else '3600'))
+ARCHIVE_PAGE_MAX = int(os.environ.get('ARCHIVE_PAGE_MAX', '50'))
+CRON_SECRET = os.environ.get('CRON_SECRET')
+
+ARCHIVE_TASK_COLUMNS = ('id', 'title', 'description', 'status', 'priority', 'due_date', 'user_id', 'created_by',
+                        'created_at')
+ARCHIVE_COMMENT_COLUMNS = ('id', 'task_id', 'user_id', 'content', 'created_at')
+
+def archive_cutoff(days):
+    """'YYYY-MM-DD HH:MM:SS' (UTC, like CURRENT_TIMESTAMP) ``days`` days ago."""
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days)
+    return cutoff.strftime('%Y-%m-%d %H:%M:%S')
+
+def archive_batch(db, cutoff, limit):
+    """Move up to ``limit`` tasks completed before ``cutoff`` in one transaction; return the ids."""
+    if db.is_postgres:
+        # Concurrent archivers (several workers) take disjoint batches
+        lock = ' FOR UPDATE SKIP LOCKED'
+    else:
+        db.execute('BEGIN IMMEDIATE')
+        lock = ''
+    rows = db.execute(f"""
+        SELECT id, user_id, created_by FROM tasks
+        WHERE status = 'Completed' AND completed_at < ?
+        ORDER BY completed_at, id
+        LIMIT ?{lock}
+    """, (cutoff, limit)).fetchall()
+    if not rows:
+        db.commit()
+        return []
+    ids = [row['id'] for row in rows]
+    placeholders = ','.join(['?'] * len(ids))
+    task_columns = ', '.join(ARCHIVE_TASK_COLUMNS + ('completed_at', 'comment_count'))
+    comment_columns = ', '.join(ARCHIVE_COMMENT_COLUMNS)
+    db.execute(f"INSERT INTO archived_tasks ({task_columns}) SELECT {task_columns} FROM tasks WHERE id IN ({placeholders})", ids)
+    db.execute(f"INSERT INTO archived_comments ({comment_columns}) SELECT {comment_columns} FROM comments WHERE task_id IN ({placeholders})", ids)
+    # Tasks first: the comment summary/search triggers then have no task row
+    # left to refresh (on Postgres the FK cascade already removes the comments)
+    db.execute(f"DELETE FROM tasks WHERE id IN ({placeholders})", ids)
+    db.execute(f"DELETE FROM comments WHERE task_id IN ({placeholders})", ids)
+    recipients = {row['user_id'] for row in rows} | {row['created_by'] for row in rows}
+    emit_event(db, 'tasks-batch', recipients, {'created': [], 'updated': [], 'deleted': ids})
+    db.commit()
+    metrics.inc('planner_tasks_archived_total', {}, len(ids))
+    return ids
+
+def run_archival(db, days=None, batch=None):
+    """Archive every task due for it, one batch per transaction; return how many moved."""
+    cutoff = archive_cutoff(ARCHIVE_AFTER_DAYS if days is None else days)
+    batch = batch or ARCHIVE_BATCH
+    total = 0
+    while True:
+        try:
+            moved = len(archive_batch(db, cutoff, batch))
+        except Exception:
+            db.rollback()
+            raise
+        total += moved
+        if moved < batch:
+            return total
+
+_archiver = None
+_archiver_lock = threading.Lock()
+
+def _archive_loop():
+    while True:
+        time.sleep(ARCHIVE_INTERVAL)
+        try:
+            with app.app_context():
+                moved = run_archival(get_db())
+            if moved:
+                app.logger.info("Archived %s completed tasks", moved)
+        except Exception:
+            app.logger.exception("Archival failed")
+
+def start_archiver():
+    """Start the periodic archival thread once per process (if ARCHIVE_INTERVAL > 0)."""
+    global _archiver
+    if _archiver is not None or ARCHIVE_INTERVAL <= 0:
+        return
+    with _archiver_lock:
+        if _archiver is None:
+            _archiver = threading.Thread(target=_archive_loop, name='archiver', daemon=True)
+            _archiver.start()
+
+@app.cli.command('archive')
+@click.option('--days', type=int, default=None, help='Età minima (giorni dal completamento).')
+@click.option('--batch', type=int, default=None, help='Task per transazione.')
+def archive_command(days, batch):
+    """Move completed tasks older than ARCHIVE_AFTER_DAYS to the archive."""
+    moved = run_archival(get_db(), days, batch)
+    click.echo(f"Task archiviate: {moved}")
+
+@app.get('/api/archive/run')
+def api_archive_run():
+    # Vercel Cron sends "Authorization: Bearer $CRON_SECRET"
+    if CRON_SECRET:
+        if request.headers.get('Authorization') != f'Bearer {CRON_SECRET}':
+            return jsonify({"error": "Token non valido"}), 401
+    elif not session.get('app_unlocked'):
+        return jsonify({"error": "App bloccata. Inserire password."}), 403
+    try:
+        moved = run_archival(get_db())
+    except Exception as e:
+        return jsonify({"error": f"Errore Database: {e}"}), 500
+    return jsonify({"archived": moved})
+
+@app.get('/api/archive')
+def api_archive_list():
+    """Archived tasks visible to the user, latest completion first (keyset pagination)."""
+    if 'user_id' not in session:
+        return jsonify({"error": "Autenticazione richiesta"}), 401
+    db = get_db()
+    uid = session['user_id']
+    try:
+        limit = min(max(int(request.args.get('limit', ARCHIVE_PAGE_MAX)), 1), ARCHIVE_PAGE_MAX)
+    except ValueError:
+        return jsonify({"error": "Parametro 'limit' non valido"}), 400
+    try:
+        per_task = comments_per_task(TASKS_PAGE_COMMENTS)
+    except ValueError:
+        return jsonify({"error": "Parametro 'comments' non valido"}), 400
+
+    where = "(a.user_id = ? OR a.created_by = ?)"
+    params = [uid, uid]
+    cursor_arg = request.args.get('cursor')
+    if cursor_arg:
+        position = decode_cursor(cursor_arg)
+        if position is None:
+            return jsonify({"error": "Cursore non valido"}), 400
+        where += " AND (a.completed_at, a.id) < (?, ?)"
+        params.extend(position)
+    params.append(limit + 1)
+    rows = db.execute(f"""
+        SELECT a.id, a.title, a.description, a.status, a.priority, a.due_date, a.created_at, a.user_id, a.created_by,
+            a.completed_at, a.archived_at, a.comment_count
+        FROM archived_tasks a
+        WHERE {where}
+        ORDER BY a.completed_at DESC, a.id DESC
+        LIMIT ?
+    """, params).fetchall()
+
+    tasks = [task_dict(row) for row in rows]
+    next_cursor = None
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        next_cursor = encode_cursor(tasks[-1]['completed_at'], tasks[-1]['id'])
+    comments_map = load_comments(db, [t['id'] for t in tasks], per_task, table='archived_comments')
+    for t in tasks:
+        t['comments'] = comments_map.get(t['id'], [])
+    return jsonify({"tasks": tasks, "next_cursor": next_cursor})
+
+@app.post('/api/archive/<int:task_id>/restore')
+def api_archive_restore(task_id):
+    """Move an archived task (and its comments) back to the board."""
+    if 'user_id' not in session:
+        return jsonify({"error": "Autenticazione richiesta"}), 401
+    db = get_db()
+    uid = session['user_id']
+    if not db.is_postgres:
+        db.execute('BEGIN IMMEDIATE')
+    lock = ' FOR UPDATE' if db.is_postgres else ''
+    task = db.execute(f'SELECT id, user_id, created_by FROM archived_tasks WHERE id = ?{lock}', (task_id,)).fetchone()
+    if not task:
+        db.rollback()
+        return jsonify({"error": "Task non trovata nell'archivio"}), 404
+    if uid not in (task['user_id'], task['created_by']):
+        db.rollback()
+        return jsonify({"error": "Permessi insufficienti"}), 403
+
+    task_columns = ', '.join(ARCHIVE_TASK_COLUMNS)
+    comment_columns = ', '.join(ARCHIVE_COMMENT_COLUMNS)
+    try:
+        # The archival clock restarts: completed_at = now. Comment counters
+        # and the search index are rebuilt by the triggers on insert.
+        db.execute(f"""
+            INSERT INTO tasks ({task_columns}, completed_at)
+            SELECT {task_columns}, CURRENT_TIMESTAMP FROM archived_tasks WHERE id = ?
+        """, (task_id,))
+        db.execute(f"""
+            INSERT INTO comments ({comment_columns})
+            SELECT {comment_columns} FROM archived_comments WHERE task_id = ? ORDER BY id
+        """, (task_id,))
+        db.execute('DELETE FROM archived_comments WHERE task_id = ?', (task_id,))
+        db.execute('DELETE FROM archived_tasks WHERE id = ?', (task_id,))
+        res_task = fetch_tasks_by_id(db, [task_id])[task_id]
+        res_task['comments'] = load_comments(db, [task_id]).get(task_id, [])
+        emit_event(db, 'task-created', (res_task['user_id'], res_task['created_by']), {'task': res_task})
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        return jsonify({"error": f"Errore Database: {e}"}), 500
+    return jsonify({"message": "Task ripristinata", "task": res_task}), 200
 
 @app.after_request
 def add_header(response):
+    if request.endpoint == 'static':
+        filename = (request.view_args or {}).get('filename', '')
+        version = request.args.get('v')
+        if version and version == asset_hash(filename):
+            response.headers['Cache-Control'] = f'public, max-age={STATIC_MAX_AGE}, immutable'
+        else:
+            response.headers['Cache-Control'] = 'public, no-cache'
+        return response
+    if response.headers.get('ETag'):
+        # Validated responses may be kept by the browser, but must be
+        # revalidated (If-None-Match) on every use
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.vary.add('Cookie')
+        return response
     response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0, max-age=0'
     response.headers['Pragma'] = 'no-cache'
     response.headers['Expires'] = '-1'
     return response
 
+# Response compression
+#
+# API responses are compressed with the best encoding the client accepts
+# (br, zstd or gzip, in COMPRESS_ENCODINGS order among equal q-values).
+# Bodies smaller than COMPRESS_MIN_SIZE go out as they are; streamed bodies
+# are compressed chunk by chunk and flushed after each one, so nothing is
+# buffered. Static files are served precompressed instead (compress-static).
+
+COMPRESS = os.environ.get('COMPRESS', '1') != '0'
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', '1024'))
+COMPRESS_ENCODINGS = [e.strip() for e in os.environ.get('COMPRESS_ENCODINGS', 'br,zstd,gzip').split(',') if e.strip()]
+COMPRESS_LEVEL_GZIP = int(os.environ.get('COMPRESS_LEVEL_GZIP', '6'))
+COMPRESS_LEVEL_BR = int(os.environ.get('COMPRESS_LEVEL_BR', '4'))
+COMPRESS_LEVEL_ZSTD = int(os.environ.get('COMPRESS_LEVEL_ZSTD', '3'))
+COMPRESSIBLE_TYPES = ('application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript')
+
+class _GzipStream:
+    def __init__(self):
+        self._z = zlib.compressobj(COMPRESS_LEVEL_GZIP, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def compress(self, chunk):
+        return self._z.compress(chunk) + self._z.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._z.flush()
+
+class _BrotliStream:
+    def __init__(self):
+        self._c = brotli.Compressor(quality=COMPRESS_LEVEL_BR)
+
+    def compress(self, chunk):
+        return self._c.process(chunk) + self._c.flush()
+
+    def finish(self):
+        return self._c.finish()
+
+class _ZstdStream:
+    def __init__(self):
+        import zstandard
+        self._c = zstandard.ZstdCompressor(level=COMPRESS_LEVEL_ZSTD).compressobj()
+        self._flush_mode = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+
+    def compress(self, chunk):
+        return self._c.compress(chunk) + self._c.flush(self._flush_mode)
+
+    def finish(self):
+        return self._c.flush()
+
+COMPRESSORS = {'gzip': _GzipStream}
+if brotli is not None:
+    COMPRESSORS['br'] = _BrotliStream
+if HAS_ZSTANDARD:
+    COMPRESSORS['zstd'] = _ZstdStream
+
+def negotiate_encoding():
+    available = [e for e in COMPRESS_ENCODINGS if e in COMPRESSORS]
+    return request.accept_encodings.best_match(available) if available else None
+
+def _compress_stream(chunks, stream):
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        if chunk:
+            yield stream.compress(chunk)
+    yield stream.finish()
+
+@app.after_request
+def compress_response(response):
+    if (not COMPRESS or request.endpoint == 'static' or request.method == 'HEAD' or response.status_code < 200
+            or response.status_code in (204, 206, 304) or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES or response.direct_passthrough):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, COMPRESSORS[encoding]())
+        response.headers.pop('Content-Length', None)
+    else:
+        if response.content_length is not None and response.content_length < COMPRESS_MIN_SIZE:
+            return response
+        started = time.perf_counter()
+        stream = COMPRESSORS[encoding]()
+        response.set_data(stream.compress(response.get_data()) + stream.finish())
+        g._compress_time = time.perf_counter() - started
+    response.headers['Content-Encoding'] = encoding
+    return response
+
 @app.get('/api/tasks/<int:task_id>/comments')
 def api_tasks_comments(task_id):
     if 'user_id' not in session:
@@ -552,11 +3649,16 @@ def api_tasks_comments(task_id):
     
     db = get_db()
     task = db.execute(
-        'SELECT id FROM tasks WHERE id = ? AND (user_id = ? OR created_by = ?)', 
+        'SELECT id, comment_count, last_comment_id FROM tasks WHERE id = ? AND (user_id = ? OR created_by = ?)',
         (task_id, session['user_id'], session['user_id'])
     ).fetchone()
     if not task:
         return jsonify({"error": "Task non trovata o accesso negato"}), 404
+
+    etag = make_etag('comments', task_id, task['comment_count'], task['last_comment_id'])
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
         
     rows = db.execute('''
         SELECT c.id, c.content, c.created_at, u.first_name, u.last_name
@@ -574,7 +3676,7 @@ def api_tasks_comments(task_id):
             "created_at": str(r["created_at"]),
             "user_name": f"{r['first_name']} {r['last_name']}"
         })
-    return jsonify({"comments": comments})
+    return with_etag(jsonify({"comments": comments}), etag)
 
 @app.post('/api/tasks/<int:task_id>/comments')
 def api_tasks_add_comment(task_id):
@@ -587,23 +3689,42 @@ def api_tasks_add_comment(task_id):
         return jsonify({"error": "Contenuto obbligatorio"}), 400
         
     db = get_db()
-    task = db.execute(
-        'SELECT id FROM tasks WHERE id = ? AND (user_id = ? OR created_by = ?)', 
-        (task_id, session['user_id'], session['user_id'])
+    uid = session['user_id']
+    # Visibility check and insert in one statement: no row means no access.
+    # The casts type the parameters for Postgres in the SELECT list.
+    row = db.execute(
+        '''INSERT INTO comments (task_id, user_id, content)
+           SELECT id, CAST(? AS INTEGER), CAST(? AS TEXT) FROM tasks
+           WHERE id = ? AND (user_id = ? OR created_by = ?)
+           RETURNING id, created_at, rev,
+               (SELECT t.user_id FROM tasks t WHERE t.id = comments.task_id) AS task_user_id,
+               (SELECT t.created_by FROM tasks t WHERE t.id = comments.task_id) AS task_created_by''',
+        (uid, content, task_id, uid, uid)
     ).fetchone()
-    if not task:
+    if not row:
+        db.rollback()
         return jsonify({"error": "Task non trovata o accesso negato"}), 404
-        
-    db.execute(
-        'INSERT INTO comments (task_id, user_id, content) VALUES (?, ?, ?)',
-        (task_id, session['user_id'], content)
-    )
+
+    comment = {
+        "id": row["id"],
+        "task_id": task_id,
+        "content": content,
+        "created_at": str(row["created_at"]),
+        "user_name": session.get('user_name'),
+    }
+    emit_event(db, 'comment-added', (row['task_user_id'], row['task_created_by']), {'comment': comment},
+               rev=returned_rev(db, row))
     db.commit()
     
-    return jsonify({"message": "Commento aggiunto"}), 201
+    return jsonify({"message": "Commento aggiunto", "comment": comment}), 201
+
+_startup_marks.append(('module', time.perf_counter()))
+if FAST_STARTUP:
+    warm_up()
+    _startup_marks.append(('warm_up', time.perf_counter()))
 
 if __name__ == '__main__':
-    # Initialize DB (creates tables if needed)
+    # Initialize DB (applies pending migrations)
     with app.app_context():
         init_db()
     app.run(host='127.0.0.1', port=5011, debug=True)
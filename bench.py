@@ -0,0 +1,297 @@
+"""Load test / benchmark for the Planner API.
+
+Seeds a throw-away database (SQLite by default, or the Postgres database
+given with --postgres), then drives the real endpoints concurrently through
+the WSGI app and reports throughput and p50/p95/p99 latency per route.
+
+    python bench.py --users 50 --tasks-per-user 200 --comments-per-task 5
+    python bench.py --output results.json --baseline baseline.json
+    python bench.py --cold-starts 10 --duration 0
+
+Results are written as JSON; with --baseline the run is compared against a
+previous result and the exit code is 1 if any route's p95 regressed by more
+than --threshold (default 20%). --cold-starts N also starts N fresh
+interpreters that import app.py and serve one request, and reports the
+median of each startup phase (app.startup_report()).
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_PASSWORD = 'bench-password'
+MIN_SAMPLES = 20
+
+# The first request must reach the database (connect, pool, schema check,
+# user cache): the session is set up without a request, then a page of tasks
+# is fetched for a seeded user.
+COLD_START_SCRIPT = '''
+import json, sys
+sys.path.insert(0, sys.argv[1])
+import app
+client = app.app.test_client()
+with client.session_transaction() as session:
+    session.update(app_unlocked=True, user_id=int(sys.argv[2]), user_name='Bench')
+response = client.get('/api/tasks?limit=20')
+assert response.status_code == 200, response.status_code
+print(json.dumps(app.startup_report()))
+'''
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--tasks-per-user', type=int, default=100)
+    parser.add_argument('--comments-per-task', type=int, default=3)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds of load per run')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--postgres', metavar='URL', help='benchmark against this (disposable!) Postgres database')
+    parser.add_argument('--output', metavar='FILE', help='write JSON results here')
+    parser.add_argument('--baseline', metavar='FILE', help='compare against a previous JSON result')
+    parser.add_argument('--threshold', type=float, default=0.20, help='allowed p95 regression (0.20 = 20%%)')
+    parser.add_argument('--cold-starts', type=int, default=0, metavar='N',
+                        help='also measure N cold starts (import + first request) in fresh processes')
+    return parser.parse_args(argv)
+
+def load_app(args):
+    # app.py reads its configuration at import time
+    if args.postgres:
+        os.environ['DATABASE_URL'] = args.postgres
+    else:
+        os.environ.pop('DATABASE_URL', None)
+        os.environ['DATABASE_FILE'] = os.path.join(tempfile.mkdtemp(prefix='planner-bench-'), 'bench.db')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app as planner
+    planner.app.config['TESTING'] = True
+    return planner
+
+def seed(planner, args):
+    """Insert users, tasks and comments directly (one shared password hash)."""
+    rng = random.Random(args.seed)
+    statuses = ['To Do', 'In Progress', 'Completed']
+    priorities = ['Bassa', 'Media', 'Alta']
+    started = time.perf_counter()
+    with planner.app.app_context():
+        db = planner.get_db()
+        planner.migrate(db)
+        pwd_hash = planner.generate_password_hash(BENCH_PASSWORD)
+        users = [(f"Bench{i}", f"User{i}") for i in range(args.users)]
+        db.executemany(
+            'INSERT INTO users (first_name, last_name, password_hash, login_key) VALUES (?, ?, ?, ?)',
+            [(first, last, pwd_hash, planner.login_key(f"{first} {last}")) for first, last in users]
+        )
+        db.commit()
+        user_ids = [row['id'] for row in db.execute(
+            "SELECT id FROM users WHERE first_name LIKE 'Bench%' ORDER BY id").fetchall()]
+
+        tasks = []
+        for creator in user_ids:
+            for n in range(args.tasks_per_user):
+                tasks.append((
+                    f"Task {n} di {creator}", "Descrizione di prova " * rng.randint(1, 8),
+                    rng.choice(statuses), rng.choice(priorities), f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                    rng.choice(user_ids), creator,
+                ))
+        db.executemany(
+            'INSERT INTO tasks (title, description, status, priority, due_date, user_id, created_by) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            tasks
+        )
+        db.commit()
+        task_rows = db.execute('SELECT id, user_id, created_by FROM tasks').fetchall()
+        comments = [
+            (row['id'], rng.choice((row['user_id'], row['created_by'])), f"Commento {n} " * rng.randint(1, 5))
+            for row in task_rows for n in range(args.comments_per_task)
+        ]
+        db.executemany('INSERT INTO comments (task_id, user_id, content) VALUES (?, ?, ?)', comments)
+        db.commit()
+        tasks_by_creator = {}
+        for row in task_rows:
+            tasks_by_creator.setdefault(row['created_by'], []).append(row['id'])
+    elapsed = time.perf_counter() - started
+    print(f"Seed: {len(user_ids)} utenti, {len(task_rows)} task, {len(comments)} commenti in {elapsed:.1f}s")
+    return users, user_ids, tasks_by_creator
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+
+    def record(self, route, seconds, ok):
+        with self._lock:
+            self.samples.setdefault(route, []).append(seconds)
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+def timed(recorder, route, call, expected=(200, 201, 304)):
+    started = time.perf_counter()
+    try:
+        response = call()
+        response.get_data()  # include streamed bodies in the timing
+        ok = response.status_code in expected
+    except Exception:
+        response, ok = None, False
+    recorder.record(route, time.perf_counter() - started, ok)
+    return response
+
+def worker(planner, args, users, user_ids, tasks_by_creator, recorder, deadline, seed_value):
+    rng = random.Random(seed_value)
+    client = planner.app.test_client()
+    index = rng.randrange(len(users))
+    first, last = users[index]
+    uid = user_ids[index]
+    own_tasks = tasks_by_creator.get(uid) or [None]
+
+    timed(recorder, 'POST /api/unlock', lambda: client.post('/api/unlock', json={'password': planner.APP_PASSWORD}))
+    timed(recorder, 'POST /api/signin', lambda: client.post(
+        '/api/signin', json={'fullName': f"{first} {last}", 'password': BENCH_PASSWORD}))
+
+    # Weighted mix, read-heavy like the real UI
+    actions = (
+        ['list'] * 5 + ['list_page'] * 2 + ['comments'] * 3 + ['create'] + ['update'] * 2 + ['comment']
+    )
+    while time.perf_counter() < deadline:
+        action = rng.choice(actions)
+        task_id = rng.choice(own_tasks)
+        if action == 'list':
+            timed(recorder, 'GET /api/tasks', lambda: client.get('/api/tasks'))
+        elif action == 'list_page':
+            timed(recorder, 'GET /api/tasks?limit=50', lambda: client.get('/api/tasks?limit=50'))
+        elif action == 'comments' and task_id:
+            timed(recorder, 'GET /api/tasks/<id>/comments', lambda: client.get(f'/api/tasks/{task_id}/comments'))
+        elif action == 'create':
+            timed(recorder, 'POST /api/tasks', lambda: client.post('/api/tasks', json={
+                'title': f'Bench {rng.random():.6f}', 'status': 'To Do', 'priority': 'Media'}))
+        elif action == 'update' and task_id:
+            timed(recorder, 'PUT /api/tasks/<id>', lambda: client.put(
+                f'/api/tasks/{task_id}', json={'status': rng.choice(['To Do', 'In Progress'])}))
+        elif action == 'comment' and task_id:
+            timed(recorder, 'POST /api/tasks/<id>/comments', lambda: client.post(
+                f'/api/tasks/{task_id}/comments', json={'content': 'commento di carico'}))
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+def summarize(recorder, wall_time):
+    routes = {}
+    for route, samples in sorted(recorder.samples.items()):
+        values = sorted(samples)
+        routes[route] = {
+            'count': len(values),
+            'errors': recorder.errors.get(route, 0),
+            'throughput_rps': round(len(values) / wall_time, 2),
+            'mean_ms': round(statistics.fmean(values) * 1000, 3),
+            'p50_ms': round(percentile(values, 0.50) * 1000, 3),
+            'p95_ms': round(percentile(values, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(values, 0.99) * 1000, 3),
+        }
+    return routes
+
+def print_report(routes):
+    print(f"{'route':36} {'count':>7} {'err':>5} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for route, r in routes.items():
+        print(f"{route:36} {r['count']:>7} {r['errors']:>5} {r['throughput_rps']:>8} "
+              f"{r['p50_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9}")
+
+def compare(routes, baseline, threshold):
+    """Print p95 deltas against ``baseline``; return the regressed routes."""
+    regressions = []
+    print(f"\n{'route':36} {'p95 base':>9} {'p95 now':>9} {'delta':>8}")
+    for route, r in routes.items():
+        base = baseline.get('routes', {}).get(route)
+        # Too few samples (sign-in warm-up) give meaningless percentiles
+        if not base or not base['p95_ms'] or min(base['count'], r['count']) < MIN_SAMPLES:
+            continue
+        delta = (r['p95_ms'] - base['p95_ms']) / base['p95_ms']
+        flag = '  REGRESSION' if delta > threshold else ''
+        print(f"{route:36} {base['p95_ms']:>9} {r['p95_ms']:>9} {delta:>+8.1%}{flag}")
+        if delta > threshold:
+            regressions.append(route)
+    return regressions
+
+def measure_cold_starts(count, user_id):
+    """Median duration (ms) of each startup phase over ``count`` fresh interpreters.
+
+    They inherit the benchmark's database settings and serve one DB-backed
+    request as ``user_id``.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    runs = []
+    for _ in range(count):
+        out = subprocess.run([sys.executable, '-c', COLD_START_SCRIPT, here, str(user_id)],
+                             capture_output=True, text=True, check=True)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {phase: round(statistics.median(r.get(phase, 0.0) for r in runs) * 1000, 3) for phase in runs[0]}
+
+def main(argv=None):
+    args = parse_args(argv)
+    planner = load_app(args)
+    users, user_ids, tasks_by_creator = seed(planner, args)
+
+    recorder = Recorder()
+    started = time.perf_counter()
+    deadline = started + args.duration
+    threads = [
+        threading.Thread(target=worker, args=(planner, args, users, user_ids, tasks_by_creator,
+                                              recorder, deadline, args.seed + i))
+        for i in range(args.concurrency)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall_time = time.perf_counter() - started
+
+    routes = summarize(recorder, wall_time)
+    print_report(routes)
+    result = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'backend': 'postgres' if args.postgres else 'sqlite',
+        'config': {
+            'users': args.users, 'tasks_per_user': args.tasks_per_user,
+            'comments_per_task': args.comments_per_task, 'concurrency': args.concurrency,
+            'duration': args.duration, 'seed': args.seed,
+        },
+        'wall_time_s': round(wall_time, 3),
+        'routes': routes,
+    }
+    if args.cold_starts:
+        result['cold_start_ms'] = measure_cold_starts(args.cold_starts, user_ids[0])
+        print(f"\nCold start (mediana di {args.cold_starts}): " +
+              ', '.join(f"{phase} {ms} ms" for phase, ms in result['cold_start_ms'].items()))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        print(f"\nRisultati salvati in {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('config') != result['config']:
+            print("Attenzione: la configurazione differisce da quella del baseline")
+        regressions = compare(routes, baseline, args.threshold)
+        base_cold = baseline.get('cold_start_ms', {}).get('total')
+        cold = result.get('cold_start_ms', {}).get('total')
+        if base_cold and cold:
+            delta = (cold - base_cold) / base_cold
+            flag = '  REGRESSION' if delta > args.threshold else ''
+            print(f"{'cold start (total)':36} {base_cold:>9} {cold:>9} {delta:>+8.1%}{flag}")
+            if delta > args.threshold:
+                regressions.append('cold start')
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
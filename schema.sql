@@ -5,6 +5,7 @@ CREATE TABLE IF NOT EXISTS users (
     last_name TEXT NOT NULL,
     password_hash TEXT NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    login_key TEXT,
     UNIQUE(first_name, last_name)
 );
 
@@ -15,10 +16,16 @@ CREATE TABLE IF NOT EXISTS tasks (
     description TEXT,
     status TEXT DEFAULT 'To Do',
     priority TEXT,
-    due_date TEXT,
+    due_date DATE,
     user_id INTEGER,
     created_by INTEGER,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    rev BIGINT NOT NULL DEFAULT 0,
+    comment_count INTEGER NOT NULL DEFAULT 0,
+    last_comment_id INTEGER,
+    last_comment_at TIMESTAMP,
+    search_vector tsvector,
+    completed_at TIMESTAMP
 );
 
 -- Comments table
@@ -28,6 +35,187 @@ CREATE TABLE IF NOT EXISTS comments (
     user_id INTEGER NOT NULL,
     content TEXT NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    rev BIGINT NOT NULL DEFAULT 0,
     FOREIGN KEY(task_id) REFERENCES tasks(id) ON DELETE CASCADE,
     FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
 );
+
+-- Indexes for the task list / comments queries
+CREATE INDEX IF NOT EXISTS idx_tasks_user_created ON tasks (user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_tasks_creator_created ON tasks (created_by, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_comments_task_created ON comments (task_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_comments_user ON comments (user_id);
+
+-- Change tracking (delta sync): global revision sequence and tombstones
+CREATE SEQUENCE IF NOT EXISTS sync_rev_seq AS BIGINT;
+
+CREATE TABLE IF NOT EXISTS tombstones (
+    id SERIAL PRIMARY KEY,
+    entity TEXT NOT NULL,
+    entity_id INTEGER NOT NULL,
+    task_id INTEGER,
+    user_id INTEGER,
+    created_by INTEGER,
+    rev BIGINT NOT NULL,
+    deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- A writing transaction holds a shared advisory lock (key space 0x706C6E72)
+-- on a lower bound of its revisions; readers stay below the lowest one
+CREATE OR REPLACE FUNCTION bump_sync_rev() RETURNS BIGINT AS $$
+BEGIN
+    IF current_setting('planner.sync_writer', true) IS DISTINCT FROM '1' THEN
+        PERFORM pg_advisory_xact_lock_shared(1886154354, (SELECT last_value FROM sync_rev_seq)::integer);
+        PERFORM set_config('planner.sync_writer', '1', true);
+    END IF;
+    RETURN nextval('sync_rev_seq');
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION visible_sync_rev() RETURNS BIGINT AS $$
+DECLARE
+    latest BIGINT;
+    pending BIGINT;
+BEGIN
+    SELECT CASE WHEN is_called THEN last_value ELSE last_value - 1 END INTO latest FROM sync_rev_seq;
+    SELECT MIN(objid::bigint) INTO pending FROM pg_locks
+    WHERE locktype = 'advisory' AND classid = 1886154354 AND objsubid = 2
+      AND database = (SELECT oid FROM pg_database WHERE datname = current_database());
+    RETURN LEAST(latest, pending - 1);
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION set_row_rev() RETURNS trigger AS $$
+BEGIN
+    NEW.rev := bump_sync_rev();
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION tasks_tombstone() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO tombstones (entity, entity_id, task_id, user_id, created_by, rev)
+        VALUES ('task', OLD.id, OLD.id, OLD.user_id, OLD.created_by, bump_sync_rev());
+    ELSIF OLD.user_id IS DISTINCT FROM NEW.user_id THEN
+        INSERT INTO tombstones (entity, entity_id, task_id, user_id, created_by, rev)
+        VALUES ('task', OLD.id, OLD.id, OLD.user_id, NULL, bump_sync_rev());
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION comments_tombstone() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO tombstones (entity, entity_id, task_id, user_id, rev)
+    VALUES ('comment', OLD.id, OLD.task_id, OLD.user_id, bump_sync_rev());
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS tasks_rev ON tasks;
+CREATE TRIGGER tasks_rev BEFORE INSERT OR UPDATE ON tasks FOR EACH ROW EXECUTE FUNCTION set_row_rev();
+DROP TRIGGER IF EXISTS comments_rev ON comments;
+CREATE TRIGGER comments_rev BEFORE INSERT OR UPDATE ON comments FOR EACH ROW EXECUTE FUNCTION set_row_rev();
+DROP TRIGGER IF EXISTS tasks_tombstone ON tasks;
+CREATE TRIGGER tasks_tombstone AFTER UPDATE OR DELETE ON tasks FOR EACH ROW EXECUTE FUNCTION tasks_tombstone();
+DROP TRIGGER IF EXISTS comments_tombstone ON comments;
+CREATE TRIGGER comments_tombstone AFTER DELETE ON comments FOR EACH ROW EXECUTE FUNCTION comments_tombstone();
+
+CREATE INDEX IF NOT EXISTS idx_tasks_rev ON tasks (rev);
+CREATE INDEX IF NOT EXISTS idx_comments_rev ON comments (rev);
+CREATE INDEX IF NOT EXISTS idx_tombstones_rev ON tombstones (rev);
+
+-- Sign-in lookup by normalized full name (lowercase, single spaces), one user per key
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_login_key ON users (login_key);
+
+-- Comment summary on tasks (comment_count, last_comment_id, last_comment_at)
+CREATE OR REPLACE FUNCTION comments_summary() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE tasks SET comment_count = comment_count + 1,
+            last_comment_id = NEW.id, last_comment_at = NEW.created_at
+        WHERE id = NEW.task_id;
+    ELSE
+        UPDATE tasks SET comment_count = GREATEST(comment_count - 1, 0),
+            last_comment_id = (SELECT c.id FROM comments c WHERE c.task_id = OLD.task_id ORDER BY c.id DESC LIMIT 1),
+            last_comment_at = (SELECT c.created_at FROM comments c WHERE c.task_id = OLD.task_id ORDER BY c.id DESC LIMIT 1)
+        WHERE id = OLD.task_id;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS comments_summary ON comments;
+CREATE TRIGGER comments_summary AFTER INSERT OR DELETE ON comments FOR EACH ROW EXECUTE FUNCTION comments_summary();
+
+-- Full-text search over title (A), description (B) and comments (C)
+CREATE OR REPLACE FUNCTION task_search_vector(p_task_id INTEGER, p_title TEXT, p_description TEXT)
+RETURNS tsvector AS $$
+    SELECT setweight(to_tsvector('simple', coalesce(p_title, '')), 'A')
+        || setweight(to_tsvector('simple', coalesce(p_description, '')), 'B')
+        || setweight(to_tsvector('simple', coalesce(
+            (SELECT string_agg(content, ' ') FROM comments WHERE task_id = p_task_id), '')), 'C')
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION tasks_search_refresh() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := task_search_vector(NEW.id, NEW.title, NEW.description);
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION comments_search_refresh() RETURNS trigger AS $$
+DECLARE
+    target INTEGER := CASE WHEN TG_OP = 'DELETE' THEN OLD.task_id ELSE NEW.task_id END;
+BEGIN
+    UPDATE tasks SET search_vector = task_search_vector(id, title, description) WHERE id = target;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS tasks_search ON tasks;
+CREATE TRIGGER tasks_search BEFORE INSERT OR UPDATE OF title, description ON tasks FOR EACH ROW EXECUTE FUNCTION tasks_search_refresh();
+DROP TRIGGER IF EXISTS comments_search ON comments;
+CREATE TRIGGER comments_search AFTER INSERT OR DELETE ON comments FOR EACH ROW EXECUTE FUNCTION comments_search_refresh();
+CREATE INDEX IF NOT EXISTS idx_tasks_search ON tasks USING GIN (search_vector);
+
+-- Dashboard counters (migration 8)
+CREATE INDEX IF NOT EXISTS idx_tasks_user_summary ON tasks (user_id, status, priority, due_date, created_by);
+CREATE INDEX IF NOT EXISTS idx_tasks_creator_summary ON tasks (created_by, status, priority, due_date, user_id);
+
+-- Typed due dates (migration 9)
+CREATE INDEX IF NOT EXISTS idx_tasks_user_due ON tasks (user_id, due_date);
+CREATE INDEX IF NOT EXISTS idx_tasks_creator_due ON tasks (created_by, due_date);
+
+-- Archive of completed tasks (migration 10)
+CREATE TABLE IF NOT EXISTS archived_tasks (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    description TEXT,
+    status TEXT,
+    priority TEXT,
+    due_date DATE,
+    user_id INTEGER,
+    created_by INTEGER,
+    created_at TIMESTAMP,
+    completed_at TIMESTAMP,
+    comment_count INTEGER NOT NULL DEFAULT 0,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS archived_comments (
+    id INTEGER PRIMARY KEY,
+    task_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    created_at TIMESTAMP,
+    FOREIGN KEY(task_id) REFERENCES archived_tasks(id) ON DELETE CASCADE,
+    FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_tasks_completed_at ON tasks (completed_at, id) WHERE status = 'Completed';
+CREATE INDEX IF NOT EXISTS idx_archived_tasks_user ON archived_tasks (user_id, completed_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_archived_tasks_creator ON archived_tasks (created_by, completed_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_archived_comments_task ON archived_comments (task_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_archived_comments_user ON archived_comments (user_id);
@@ -446,6 +446,7 @@ document.addEventListener('DOMContentLoaded', () => {
     try {
       const res = await fetch(`/api/tasks/${taskId}`, { method: 'DELETE' });
       if (res.ok) {
+        taskStore.delete(taskId);
         cardEl.remove();
         // Se era completata, aggiorna contatore
         if (cardEl.classList.contains('completed')) {
@@ -521,37 +522,144 @@ document.addEventListener('DOMContentLoaded', () => {
     }
   }
 
+  // Copia locale delle task: dopo il primo caricamento completo si chiedono
+  // al server solo le modifiche successive alla revisione `syncRev`.
+  const taskStore = new Map();
+  let syncRev = null;
+
+  function resetTaskStore() {
+    taskStore.clear();
+    syncRev = null;
+  }
+
+  function applyChanges(data) {
+    (data.deleted?.tasks || []).forEach(id => taskStore.delete(id));
+    const deletedComments = new Set(data.deleted?.comments || []);
+    if (deletedComments.size > 0) {
+      taskStore.forEach(t => {
+        t.comments = (t.comments || []).filter(c => !deletedComments.has(c.id));
+      });
+    }
+    (data.tasks || []).forEach(t => taskStore.set(t.id, t));
+    (data.comments || []).forEach(c => {
+      const t = taskStore.get(c.task_id);
+      if (!t) return;
+      t.comments = t.comments || [];
+      if (!t.comments.some(x => x.id === c.id)) t.comments.push(c);
+    });
+  }
+
+  function renderTasks() {
+    const tasks = Array.from(taskStore.values()).sort((a, b) => {
+      if (a.created_at !== b.created_at) return a.created_at < b.created_at ? 1 : -1;
+      return b.id - a.id;
+    });
+    clearTasks();
+    if (tasks.length > 0) {
+      // Rimuove 'Nessuna task' se ci sono task
+      if (todoList) todoList.textContent = '';
+      if (progressList) progressList.textContent = '';
+      
+      // Iteriamo e aggiungiamo
+      tasks.forEach(addTaskToColumn);
+      
+      // Se una lista è rimasta vuota, rimettiamo il placeholder
+      if (todoList && todoList.children.length === 0) {
+        todoList.classList.add('empty');
+        todoList.textContent = 'Nessuna task';
+      }
+      if (progressList && progressList.children.length === 0) {
+        progressList.classList.add('empty');
+        progressList.textContent = 'Nessuna task';
+      }
+
+      // Aggiorna contatore completate
+      updateCompletedCount();
+    }
+  }
+
   async function fetchTasks() {
     try {
-      const res = await fetch(`/api/tasks?t=${Date.now()}`);
-      const data = await res.json();
-      const tasks = data.tasks || [];
-      clearTasks();
-      if (tasks.length > 0) {
-        // Rimuove 'Nessuna task' se ci sono task
-        if (todoList) todoList.textContent = '';
-        if (progressList) progressList.textContent = '';
-        
-        // Iteriamo e aggiungiamo
-        tasks.forEach(addTaskToColumn);
-        
-        // Se una lista è rimasta vuota, rimettiamo il placeholder
-        if (todoList && todoList.children.length === 0) {
-          todoList.classList.add('empty');
-          todoList.textContent = 'Nessuna task';
-        }
-        if (progressList && progressList.children.length === 0) {
-          progressList.classList.add('empty');
-          progressList.textContent = 'Nessuna task';
+      if (syncRev === null) {
+        const res = await fetch(`/api/tasks`);
+        const data = await res.json();
+        taskStore.clear();
+        (data.tasks || []).forEach(t => taskStore.set(t.id, t));
+        syncRev = data.rev ?? null;
+      } else {
+        const res = await fetch(`/api/tasks/changes?since=${syncRev}`);
+        if (!res.ok) {
+          // Stato non più valido: ricarica tutto
+          resetTaskStore();
+          return fetchTasks();
         }
-
-        // Aggiorna contatore completate
-        updateCompletedCount();
+        const data = await res.json();
+        applyChanges(data);
+        syncRev = data.rev;
       }
+      renderTasks();
     } catch (err) {}
   }
 
 
+  // Aggiornamenti in tempo reale: ad ogni evento si scaricano solo le modifiche.
+  // Se lo stream non è disponibile (es. su Vercel) si interroga periodicamente
+  // /api/tasks/changes.
+  const POLL_INTERVAL = 15000;
+  let eventSource = null;
+  let refreshTimer = null;
+  let pollTimer = null;
+
+  function scheduleRefresh(delay = 300) {
+    clearTimeout(refreshTimer);
+    refreshTimer = setTimeout(() => {
+      // Non ridisegnare le card mentre l'utente sta scrivendo un commento
+      const active = document.activeElement;
+      if (active && active.tagName === 'TEXTAREA' && active.closest('.task-card')) {
+        scheduleRefresh(2000);
+        return;
+      }
+      fetchTasks();
+    }, delay);
+  }
+
+  function startPolling() {
+    if (pollTimer) return;
+    pollTimer = setInterval(() => {
+      // Scheda in background: si aggiorna quando torna visibile
+      if (!document.hidden) scheduleRefresh(0);
+    }, POLL_INTERVAL);
+  }
+
+  function startLiveUpdates() {
+    if (eventSource || pollTimer) return;
+    if (!window.EventSource) {
+      startPolling();
+      return;
+    }
+    eventSource = new EventSource('/api/events');
+    ['task-created', 'task-updated', 'task-deleted', 'tasks-batch', 'comment-added', 'changes', 'resync'].forEach(type => {
+      eventSource.addEventListener(type, () => scheduleRefresh());
+    });
+    eventSource.addEventListener('error', () => {
+      // Stream disattivato (204) o rifiutato: il browser non si riconnette più
+      if (eventSource && eventSource.readyState === EventSource.CLOSED) {
+        eventSource = null;
+        startPolling();
+      }
+    });
+  }
+
+  function stopLiveUpdates() {
+    clearTimeout(refreshTimer);
+    clearInterval(pollTimer);
+    pollTimer = null;
+    if (eventSource) {
+      eventSource.close();
+      eventSource = null;
+    }
+  }
+
   function setAuthUI(authenticated, fullName = '') {
     const manageUsersBtn = document.getElementById('manageUsersBtn');
     if (authenticated) {
@@ -679,7 +787,10 @@ document.addEventListener('DOMContentLoaded', () => {
       currentUserId = data.user_id;
       setAuthUI(true, data.user || '');
       // Carica le task dopo il login!
+      resetTaskStore();
       fetchTasks();
+      stopLiveUpdates();
+      startLiveUpdates();
     } catch (err) {
       signinError.textContent = 'Errore di rete';
     }
@@ -697,17 +808,30 @@ document.addEventListener('DOMContentLoaded', () => {
       } finally {
         currentUserId = null;
         setAuthUI(false, '');
+        stopLiveUpdates();
+        resetTaskStore();
         clearTasks();
       }
     });
   }
 
+  // Condivisa dal menu degli assegnatari e dalla modale utenti: le chiamate
+  // contemporanee riusano la stessa richiesta, che il browser rivalida con l'ETag
+  let usersRequest = null;
+  function fetchUsers() {
+    if (!usersRequest) {
+      usersRequest = fetch('/api/users')
+        .then(res => res.json())
+        .then(data => data.users || [])
+        .finally(() => { usersRequest = null; });
+    }
+    return usersRequest;
+  }
+
   async function loadUsers() {
     if (!assignToSelect) return;
     try {
-      const res = await fetch('/api/users');
-      const data = await res.json();
-      const users = data.users || [];
+      const users = await fetchUsers();
       // Svuota tranne 'Me'
       assignToSelect.innerHTML = '<option value="" selected>Me</option>';
       users.forEach(u => {
@@ -775,6 +899,7 @@ document.addEventListener('DOMContentLoaded', () => {
         return;
       }
       const task = data.task;
+      taskStore.set(task.id, { comments: [], ...task });
       addTaskToColumn(task);
       closeModal(newTaskModal, newTaskBackdrop);
       newTaskForm.reset();
@@ -808,6 +933,7 @@ document.addEventListener('DOMContentLoaded', () => {
         currentUserId = data.user_id;
         setAuthUI(true, data.user || '');
         fetchTasks();
+        startLiveUpdates();
       } else {
         currentUserId = null;
         setAuthUI(false, '');
@@ -857,9 +983,7 @@ document.addEventListener('DOMContentLoaded', () => {
     if (!usersList) return;
     usersList.innerHTML = '<li>Caricamento...</li>';
     try {
-      const res = await fetch('/api/users');
-      const data = await res.json();
-      const users = data.users || [];
+      const users = await fetchUsers();
       usersList.innerHTML = '';
       
       if (users.length === 0) {
@@ -0,0 +1,77 @@
+import os
+import re
+import sys
+import tempfile
+
+import pytest
+
+# Configure the module before it is imported: SQLite, no background archiver
+os.environ.pop('DATABASE_URL', None)
+os.environ.pop('VERCEL', None)
+os.environ['DATABASE_FILE'] = os.path.join(tempfile.mkdtemp(prefix='planner-tests-'), 'import.db')
+os.environ['ARCHIVE_INTERVAL'] = '0'
+os.environ['FAST_STARTUP'] = '0'
+os.environ['SERVER_TIMING'] = '1'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as planner  # noqa: E402
+
+PASSWORD = 'secret1'
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """A fresh SQLite file per test; the pool drops connections to the previous one."""
+    path = str(tmp_path / 'planner.db')
+    monkeypatch.setattr(planner, 'DATABASE_FILE', path)
+    monkeypatch.setattr(planner, '_schema_checked', False)
+    planner.user_directory.invalidate()
+    yield path
+    planner.user_directory.invalidate()
+
+
+@pytest.fixture
+def db(database):
+    """DBWrapper on the test database, migrated, inside an app context."""
+    with planner.app.app_context():
+        yield planner.get_db()
+
+
+def unlock(client):
+    assert client.post('/api/unlock', json={'password': planner.APP_PASSWORD}).status_code == 200
+
+
+def signup(client, name):
+    return client.post('/api/signup', json={'fullName': name, 'password': PASSWORD, 'confirmPassword': PASSWORD})
+
+
+def signin(client, name):
+    response = client.post('/api/signin', json={'fullName': name, 'password': PASSWORD})
+    assert response.status_code == 200
+    return response.get_json()['user_id']
+
+
+@pytest.fixture
+def client(database):
+    """Unlocked client signed in as Mario Rossi (id 1); Anna Bianchi is id 2."""
+    client = planner.app.test_client()
+    unlock(client)
+    assert signup(client, 'Mario Rossi').status_code == 201
+    assert signup(client, 'Anna Bianchi').status_code == 201
+    assert signin(client, 'Mario Rossi') == 1
+    return client
+
+
+def create_task(client, title, **fields):
+    payload = {'title': title, 'status': 'To Do', 'priority': 'Media'}
+    payload.update(fields)
+    response = client.post('/api/tasks', json=payload)
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['task']
+
+
+def query_count(response):
+    """Queries run by a request, from its Server-Timing header (no db entry: none)."""
+    timing = response.headers['Server-Timing']
+    match = re.search(r'db;dur=[\d.]+;desc="(\d+) queries"', timing)
+    return int(match.group(1)) if match else 0
@@ -0,0 +1,56 @@
+import json
+
+from conftest import create_task, planner
+
+
+def read_event(chunks):
+    """Next SSE event from a streamed response as (type, data), skipping keepalives."""
+    for chunk in chunks:
+        text = chunk.decode() if isinstance(chunk, bytes) else chunk
+        fields = dict(line.split(': ', 1) for line in text.strip().splitlines() if ': ' in line and not line.startswith(':'))
+        if 'event' in fields:
+            return fields['event'], json.loads(fields['data'])
+    return None
+
+
+def test_events_stream_delivers_writes(client, monkeypatch):
+    monkeypatch.setattr(planner, 'EVENTS_ENABLED', True)
+    monkeypatch.setattr(planner, 'EVENTS_KEEPALIVE', 0.05)
+    response = client.get('/api/events', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    chunks = iter(response.response)
+    event_type, data = read_event(chunks)
+    assert event_type == 'ready'
+
+    task = create_task(client, 'live', assignTo=2)
+    event_type, data = read_event(chunks)
+    assert event_type == 'task-created' and data['task']['id'] == task['id']
+    response.close()
+    assert planner.broker.subscriber_count() == 0
+
+
+def test_events_resume_from_last_event_id(client, monkeypatch):
+    monkeypatch.setattr(planner, 'EVENTS_ENABLED', True)
+    since = client.get('/api/tasks/changes?since=0').get_json()['rev']
+    create_task(client, 'missed')
+    response = client.get('/api/events', headers={'Last-Event-ID': str(since)}, buffered=False)
+    event_type, data = read_event(iter(response.response))
+    assert event_type == 'changes'
+    assert [t['title'] for t in data['tasks']] == ['missed']
+    response.close()
+
+
+def test_events_disabled(client, monkeypatch):
+    monkeypatch.setattr(planner, 'EVENTS_ENABLED', False)
+    assert client.get('/api/events').status_code == 204
+
+
+def test_event_id_from_returned_rev(db, monkeypatch):
+    monkeypatch.setattr(planner, 'EVENTS_ENABLED', True)
+    events = planner.broker.subscribe(1)
+    before = db.query_count
+    planner.emit_event(db, 'task-deleted', (1,), {'task_id': 9}, rev=7)
+    assert db.query_count == before
+    db.commit()
+    assert events.get(timeout=1)['id'] == 7
+    planner.broker.unsubscribe(1, events)
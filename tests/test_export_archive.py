@@ -0,0 +1,138 @@
+import csv
+import io
+import json
+
+from conftest import create_task, planner, signin, signup, unlock
+
+
+def progress(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines() if line]
+
+
+def seed(client):
+    for i in range(4):
+        task = create_task(client, f'task {i} "q", x', dueDate=f'2026-01-0{i + 1}', assignTo=2 if i % 2 else None)
+        client.post(f"/api/tasks/{task['id']}/comments", json={'content': f'commento {i}\nriga 2'})
+
+
+def test_export_import_round_trip(client, monkeypatch):
+    monkeypatch.setattr(planner, 'IMPORT_BATCH', 3)
+    seed(client)
+    exported = client.get('/api/export').get_data()
+    records = [json.loads(line) for line in exported.decode().splitlines()]
+    assert [r['title'] for r in records] == [f'task {i} "q", x' for i in range(4)]
+    assert records[1]['assigned_to'] == 'Anna Bianchi'
+    assert records[0]['comments'][0]['content'] == 'commento 0\nriga 2'
+
+    lines = progress(client.post('/api/import', data=exported + b'{"title": ""}\nnot json\n',
+                                 content_type='application/x-ndjson'))
+    assert lines[0] == {'imported': 3, 'comments': 3, 'invalid': 0, 'resume_from': 3}
+    assert {'record': 5, 'error': 'Titolo mancante'} in lines
+    assert lines[-1] == {'imported': 4, 'comments': 4, 'invalid': 2, 'resume_from': 6, 'done': True}
+
+    tasks = client.get('/api/tasks').get_json()['tasks']
+    assert len(tasks) == 8
+    copies = [t for t in tasks if t['id'] > 4]
+    assert sorted(t['due_date'] for t in copies) == ['2026-01-01', '2026-01-02', '2026-01-03', '2026-01-04']
+    assert all(t['comment_count'] == 1 and t['comments'][0]['content'].startswith('commento') for t in copies)
+
+
+def test_csv_export_and_resume(client):
+    seed(client)
+    exported = client.get('/api/export?format=csv')
+    rows = list(csv.DictReader(io.StringIO(exported.get_data(as_text=True))))
+    assert [row['title'] for row in rows] == [f'task {i} "q", x' for i in range(4)]
+    assert json.loads(rows[2]['comments'])[0]['content'] == 'commento 2\nriga 2'
+
+    lines = progress(client.post('/api/import?format=csv&skip=2', data=exported.get_data(), content_type='text/csv'))
+    assert lines[-1]['imported'] == 2 and lines[-1]['done'] is True
+    assert len(client.get('/api/tasks').get_json()['tasks']) == 6
+
+
+def test_archive_and_restore(client, db):
+    for i in range(4):
+        task = create_task(client, f'task {i}', assignTo=2)
+        client.post(f"/api/tasks/{task['id']}/comments", json={'content': f'commento {i}'})
+        client.put(f"/api/tasks/{task['id']}", json={'status': 'Completed'})
+    client.put('/api/tasks/4', json={'status': 'In Progress'})
+    since = client.get('/api/tasks/changes?since=0').get_json()['rev']
+    db.execute("UPDATE tasks SET completed_at = '2020-01-01 00:00:00' WHERE id IN (1, 2, 3)")
+    db.commit()
+
+    assert planner.run_archival(db, batch=2) == 3
+    assert [t['id'] for t in client.get('/api/tasks').get_json()['tasks']] == [4]
+    assert client.get(f'/api/tasks/changes?since={since}').get_json()['deleted']['tasks'] == [1, 2, 3]
+
+    first = client.get('/api/archive?limit=2').get_json()
+    assert [(t['id'], t['comment_count'], len(t['comments'])) for t in first['tasks']] == [(3, 1, 1), (2, 1, 1)]
+    second = client.get('/api/archive', query_string={'limit': 2, 'cursor': first['next_cursor']}).get_json()
+    assert [t['id'] for t in second['tasks']] == [1] and second['next_cursor'] is None
+
+    # The assignee can restore; the task comes back with its comments
+    client.post('/api/signout')
+    unlock(client)
+    signin(client, 'Anna Bianchi')
+    restored = client.post('/api/archive/2/restore')
+    assert restored.status_code == 200
+    task = restored.get_json()['task']
+    assert (task['status'], task['comment_count'], [c['content'] for c in task['comments']]) == ('Completed', 1, ['commento 1'])
+    assert client.post('/api/archive/2/restore').status_code == 404
+    changes = client.get(f'/api/tasks/changes?since={since}').get_json()
+    assert changes['deleted'] == {'tasks': [1, 3], 'comments': []}
+    assert [t['id'] for t in changes['tasks']] == [2]
+
+
+def test_import_validation_and_error_limit(client, monkeypatch):
+    assert client.post('/api/import?format=xml', data=b'').status_code == 400
+    assert client.post('/api/import?skip=x', data=b'', content_type='application/x-ndjson').status_code == 400
+
+    records = [
+        {'title': 'ok', 'assigned_to': 'anna  BIANCHI', 'comments': [{'content': 'ciao', 'user_name': 'Nessuno'}]},
+        {'title': 'stato', 'status': 'Done'},
+        {'title': 'data', 'due_date': '31/02/2026'},
+        {'title': 'commenti', 'comments': 'testo'},
+    ]
+    body = ''.join(json.dumps(r) + '\n' for r in records).encode()
+    lines = progress(client.post('/api/import', data=body, content_type='application/x-ndjson'))
+    assert [line.get('error') for line in lines if 'record' in line] == [
+        'Stato non valido: Done', 'Data non valida', "'comments' deve essere una lista"]
+    assert lines[-1] == {'imported': 1, 'comments': 1, 'invalid': 3, 'resume_from': 4, 'done': True}
+    task = client.get('/api/tasks').get_json()['tasks'][0]
+    # Names are matched on the login key; unknown authors fall back to the importer
+    assert (task['user_id'], task['comments'][0]['user_name']) == (2, 'Mario Rossi')
+
+    monkeypatch.setattr(planner, 'IMPORT_MAX_ERRORS', 2)
+    lines = progress(client.post('/api/import', data=b'{}\n{}\n{}\n', content_type='application/x-ndjson'))
+    assert lines[-1]['error'] == 'Troppi record non validi, importazione interrotta'
+    assert 'done' not in lines[-1] and lines[-1]['invalid'] == 2
+
+
+def test_import_requires_sign_in(database):
+    client = planner.app.test_client()
+    unlock(client)
+    assert client.post('/api/import', data=b'{"title": "x"}\n', content_type='application/x-ndjson').status_code == 401
+
+
+def test_restore_permissions_and_archival_clock(client, db):
+    task = create_task(client, 'vecchia', assignTo=2)
+    client.post(f"/api/tasks/{task['id']}/comments", json={'content': 'ritrovabile'})
+    client.put(f"/api/tasks/{task['id']}", json={'status': 'Completed'})
+    db.execute("UPDATE tasks SET completed_at = '2020-01-01 00:00:00'")
+    db.commit()
+    assert planner.run_archival(db) == 1
+
+    client.post('/api/signout')
+    unlock(client)
+    assert signup(client, 'Luca Verdi').status_code == 201
+    signin(client, 'Luca Verdi')
+    assert client.post(f"/api/archive/{task['id']}/restore").status_code == 403
+    assert client.post('/api/archive/99/restore').status_code == 404
+
+    client.post('/api/signout')
+    unlock(client)
+    signin(client, 'Mario Rossi')
+    assert client.post(f"/api/archive/{task['id']}/restore").status_code == 200
+    # Restoring restarts the archival clock and rebuilds the search index
+    assert planner.run_archival(db) == 0
+    results = client.get('/api/search?q=ritrovabile').get_json()
+    assert [t['id'] for t in results['results']] == [task['id']]
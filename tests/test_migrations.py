@@ -0,0 +1,108 @@
+import sqlite3
+
+import pytest
+
+from conftest import planner, signin, unlock
+
+# SQLite schema written by the app before versioned migrations existed
+BASELINE_SCHEMA = """
+CREATE TABLE tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    description TEXT,
+    status TEXT DEFAULT 'To Do',
+    priority TEXT,
+    due_date TEXT,
+    user_id INTEGER,
+    created_by INTEGER
+);
+CREATE TABLE users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    first_name TEXT NOT NULL,
+    last_name TEXT NOT NULL,
+    password_hash TEXT NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(first_name, last_name)
+);
+CREATE TABLE comments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY(task_id) REFERENCES tasks(id) ON DELETE CASCADE,
+    FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+"""
+
+
+@pytest.fixture
+def baseline(database):
+    conn = sqlite3.connect(database)
+    conn.executescript(BASELINE_SCHEMA)
+    pwd_hash = planner.generate_password_hash('secret1')
+    conn.executemany('INSERT INTO users (first_name, last_name, password_hash) VALUES (?, ?, ?)',
+                     [('Mario', 'Rossi', pwd_hash), ('mario', 'ROSSI', pwd_hash), ('Anna', 'Bianchi', pwd_hash)])
+    conn.executemany(
+        'INSERT INTO tasks (title, description, status, priority, due_date, user_id, created_by) VALUES (?, ?, ?, ?, ?, ?, ?)',
+        [('Vecchia', 'descrizione', 'To Do', 'Alta', '05/11/2026', 3, 1),
+         ('Senza data', '', 'In Progress', 'Bassa', '', 1, 1),
+         ('Illeggibile', None, 'Completed', 'Media', 'domani', 1, 3)])
+    conn.executemany('INSERT INTO comments (task_id, user_id, content) VALUES (?, ?, ?)',
+                     [(1, 1, 'primo'), (1, 3, 'secondo')])
+    conn.commit()
+    conn.close()
+    return database
+
+
+def test_migrates_baseline_schema(baseline, caplog, db):
+    # The db fixture runs the migrations during setup
+    warnings = [r.getMessage() for r in caplog.get_records('setup')]
+    assert "Migration 9: task 3 due date 'domani' is not a date, cleared" in warnings
+    assert planner.schema_version(db) == planner.MIGRATIONS[-1][0]
+    tasks = {row['title']: row for row in db.execute('SELECT * FROM tasks').fetchall()}
+    assert tasks['Vecchia']['due_date'] == '2026-11-05'
+    assert tasks['Senza data']['due_date'] is None
+    assert tasks['Illeggibile']['due_date'] is None
+    assert tasks['Vecchia']['comment_count'] == 2
+    assert tasks['Vecchia']['last_comment_id'] == 2
+    assert tasks['Illeggibile']['completed_at'] is not None
+    keys = [row['login_key'] for row in db.execute('SELECT login_key FROM users ORDER BY id').fetchall()]
+    # Duplicate normalized names: the oldest user keeps the key (migration 11)
+    assert keys == ['mario rossi', None, 'anna bianchi']
+    assert planner.migrate(db) == []
+
+
+def test_duplicate_users_still_sign_in(baseline):
+    client = planner.app.test_client()
+    unlock(client)
+    assert signin(client, 'mario ROSSI') == 2
+    assert signin(client, 'Mario Rossi') == 1
+    response = client.post('/api/signup', json={'fullName': 'MARIO rossi', 'password': 'x' * 6, 'confirmPassword': 'x' * 6})
+    assert response.status_code == 409
+
+
+def test_login_key_is_unique(db):
+    db.execute("INSERT INTO users (first_name, last_name, password_hash, login_key) VALUES ('A', 'B', 'x', 'a b')")
+    with pytest.raises(sqlite3.IntegrityError):
+        db.execute("INSERT INTO users (first_name, last_name, password_hash, login_key) VALUES ('a', ' B', 'x', 'a b')")
+    db.rollback()
+
+
+def test_failed_migration_is_retried(database, monkeypatch):
+    version, name, step = planner.MIGRATIONS[-1]
+
+    def broken(db):
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(planner, 'MIGRATIONS', planner.MIGRATIONS[:-1] + [(version, name, broken)])
+    client = planner.app.test_client()
+    unlock(client)
+    payload = {'fullName': 'Mario Rossi', 'password': 'secret1', 'confirmPassword': 'secret1'}
+    assert client.post('/api/signup', json=payload).status_code == 500
+    assert planner._schema_checked is False
+
+    monkeypatch.setattr(planner, 'MIGRATIONS', planner.MIGRATIONS[:-1] + [(version, name, step)])
+    assert client.post('/api/signup', json=payload).status_code == 201
+    assert planner._schema_checked is True
@@ -0,0 +1,79 @@
+import re
+
+import pytest
+
+from conftest import create_task, planner, query_count
+
+# Queries per request once the user cache is warm. A change here is a
+# regression (or an improvement) of the hot paths: update deliberately.
+READS = [
+    ('/api/tasks?limit=3', 3),                  # rev, page, latest comments
+    ('/api/tasks?limit=3&comments=0', 2),       # rev, page
+    ('/api/tasks/summary', 2),                  # rev, grouped counters
+    ('/api/tasks/due', 3),                      # rev, page, latest comments
+    ('/api/tasks/changes?since=0', 6),
+    ('/api/search?q=task', 1),
+    ('/api/users', 0),                          # served from the user cache
+    ('/api/archive', 1),
+    ('/api/tasks/1/comments', 2),
+]
+
+
+@pytest.fixture
+def seeded(client):
+    for i in range(5):
+        task = create_task(client, f'task {i}', dueDate=f'2026-10-0{i + 1}', assignTo=2 if i % 2 else None)
+        client.post(f"/api/tasks/{task['id']}/comments", json={'content': 'commento'})
+    client.get('/api/users')
+    return client
+
+
+@pytest.mark.parametrize('url, expected', READS)
+def test_read_query_counts(seeded, url, expected):
+    response = seeded.get(url)
+    assert response.status_code == 200
+    assert query_count(response) == expected
+
+
+def test_not_modified_costs_one_query(seeded):
+    etag = seeded.get('/api/tasks?limit=3').headers['ETag']
+    response = seeded.get('/api/tasks?limit=3', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert query_count(response) == 1
+
+
+# The write and the event revision lookup; on Postgres RETURNING carries the
+# revision and the lookup goes away
+@pytest.mark.parametrize('method, url, payload, expected', [
+    ('post', '/api/tasks', {'title': 'nuova', 'status': 'To Do', 'priority': 'Alta'}, 2),
+    ('put', '/api/tasks/1', {'status': 'In Progress'}, 2),
+    ('delete', '/api/tasks/2', None, 2),
+    ('post', '/api/tasks/1/comments', {'content': 'altro'}, 2),
+])
+def test_write_query_counts(seeded, method, url, payload, expected):
+    response = getattr(seeded, method)(url, json=payload)
+    assert response.status_code in (200, 201)
+    assert query_count(response) == expected
+
+
+def test_batch_query_count_does_not_grow_with_creates(seeded):
+    def run(creates):
+        operations = [{'op': 'create', 'title': f'b{i}', 'status': 'To Do', 'priority': 'Alta'} for i in range(creates)]
+        return query_count(seeded.post('/api/tasks/batch', json={'operations': operations}))
+
+    assert run(1) == run(50)
+
+
+def test_streamed_list_is_counted(seeded):
+    def total():
+        text = planner.metrics.render()
+        match = re.search(r'planner_request_queries_sum\{route="/api/tasks"\} ([\d.]+)', text)
+        return float(match.group(1)) if match else 0.0
+
+    before = total()
+    response = seeded.get('/api/tasks')
+    assert response.is_streamed
+    assert len(response.get_json()['tasks']) == 5
+    response.close()
+    # rev, tasks, comments of the batch
+    assert total() - before == 3
@@ -0,0 +1,131 @@
+from conftest import create_task, planner, signin, unlock
+
+
+def pages(client, url, **params):
+    """Follow next_cursor to the end; return the task lists of each page."""
+    result = []
+    cursor = None
+    while True:
+        query = dict(params, **({'cursor': cursor} if cursor else {}))
+        body = client.get(url, query_string=query).get_json()
+        result.append(body['tasks'])
+        cursor = body['next_cursor']
+        if not cursor:
+            return result
+
+
+def test_list_cursor_round_trip(client):
+    ids = [create_task(client, f'task {i}')['id'] for i in range(7)]
+    result = pages(client, '/api/tasks', limit=3)
+    assert [len(page) for page in result] == [3, 3, 1]
+    assert [t['id'] for page in result for t in page] == ids[::-1]
+
+
+def test_list_pages_merge_assigned_and_created(client):
+    mine = [create_task(client, f'mine {i}', assignTo=2 if i % 2 else None)['id'] for i in range(4)]
+    client.post('/api/signout')
+    unlock(client)
+    signin(client, 'Anna Bianchi')
+    theirs = [create_task(client, f'theirs {i}', assignTo=1 if i % 2 else None)['id'] for i in range(4)]
+    create_task(client, 'mine too', assignTo=1)
+    visible = sorted(mine + theirs[1::2] + [theirs[-1] + 1], reverse=True)
+
+    client.post('/api/signout')
+    unlock(client)
+    signin(client, 'Mario Rossi')
+    result = pages(client, '/api/tasks', limit=2)
+    assert [t['id'] for page in result for t in page] == visible
+    assert [t['id'] for t in client.get('/api/tasks').get_json()['tasks']] == visible
+
+
+def test_invalid_cursors_are_rejected(client):
+    create_task(client, 'task')
+    for cursor in ('zzz', planner.encode_cursor('garbage', 1), planner.encode_cursor('2026-13-01 00:00:00', 1)):
+        assert client.get('/api/tasks', query_string={'cursor': cursor}).status_code == 400
+        assert client.get('/api/archive', query_string={'cursor': cursor}).status_code == 400
+    assert client.get('/api/tasks/due', query_string={'cursor': planner.encode_cursor('2026-10-01 10:00:00', 1)}).status_code == 400
+
+
+def test_due_cursor_round_trip(client):
+    dates = ['2026-10-03', '2026-10-01', '2026-10-02', '2026-10-01', '2026-10-03', '']
+    for i, due in enumerate(dates):
+        create_task(client, f'task {i}', dueDate=due, assignTo=2 if i % 2 else None)
+    result = pages(client, '/api/tasks/due', limit=2)
+    seen = [(t['due_date'], t['id']) for page in result for t in page]
+    assert seen == sorted(seen)
+    assert len(seen) == 5
+    body = client.get('/api/tasks/due', query_string={'limit': 5}).get_json()
+    assert body['has_more'] is False and body['next_cursor'] is None
+
+
+def test_etag_round_trip(client):
+    create_task(client, 'task')
+    for url in ('/api/tasks', '/api/tasks?limit=5', '/api/tasks/summary', '/api/tasks/due', '/api/users'):
+        first = client.get(url)
+        etag = first.headers['ETag']
+        assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+    client.put('/api/tasks/1', json={'status': 'In Progress'})
+    assert client.get('/api/tasks', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_changes_and_tombstones(client):
+    kept = create_task(client, 'kept')
+    dropped = create_task(client, 'dropped', assignTo=2)
+    since = client.get('/api/tasks/changes?since=0').get_json()['rev']
+
+    client.put(f"/api/tasks/{kept['id']}", json={'title': 'kept, renamed'})
+    client.post(f"/api/tasks/{kept['id']}/comments", json={'content': 'ciao'})
+    assert client.delete(f"/api/tasks/{dropped['id']}").status_code == 200
+    changes = client.get(f'/api/tasks/changes?since={since}').get_json()
+    assert [t['title'] for t in changes['tasks']] == ['kept, renamed']
+    assert [c['content'] for c in changes['tasks'][0]['comments']] == ['ciao']
+    assert changes['deleted']['tasks'] == [dropped['id']]
+    assert changes['rev'] > since
+
+    latest = client.get(f"/api/tasks/changes?since={changes['rev']}").get_json()
+    assert latest['tasks'] == [] and latest['deleted'] == {'tasks': [], 'comments': []}
+
+    # The assignee learns about the deletion too
+    client.post('/api/signout')
+    unlock(client)
+    signin(client, 'Anna Bianchi')
+    assert client.get(f'/api/tasks/changes?since={since}').get_json()['deleted']['tasks'] == [dropped['id']]
+
+
+def test_batch(client):
+    target = create_task(client, 'target')
+    doomed = create_task(client, 'doomed')
+    operations = [{'op': 'create', 'title': f'new {i}', 'status': 'To Do', 'priority': 'Bassa'} for i in range(5)]
+    operations += [
+        {'op': 'update', 'id': target['id'], 'status': 'Completed'},
+        {'op': 'delete', 'id': doomed['id']},
+        {'op': 'update', 'id': 999, 'status': 'Completed'},
+        {'op': 'create', 'title': ''},
+    ]
+    body = client.post('/api/tasks/batch', json={'operations': operations}).get_json()
+    assert body['applied'] is True
+    results = body['results']
+    assert [r['task']['title'] for r in results[:5]] == [f'new {i}' for i in range(5)]
+    assert results[5]['task']['status'] == 'Completed'
+    assert results[6] == {'index': 6, 'ok': True, 'status': 200, 'id': doomed['id']}
+    assert results[7]['status'] == 404 and results[8]['status'] == 400
+    titles = {t['title'] for t in client.get('/api/tasks').get_json()['tasks']}
+    assert titles == {'target'} | {f'new {i}' for i in range(5)}
+
+
+def test_atomic_batch_rolls_back(client):
+    response = client.post('/api/tasks/batch', json={'atomic': True, 'operations': [
+        {'op': 'create', 'title': 'ok', 'status': 'To Do', 'priority': 'Bassa'},
+        {'op': 'delete', 'id': 42},
+    ]})
+    assert response.status_code == 400
+    assert [r['status'] for r in response.get_json()['results']] == [424, 404]
+    assert client.get('/api/tasks').get_json()['tasks'] == []
+
+
+def test_batch_creates_span_several_statements(client, monkeypatch):
+    monkeypatch.setattr(planner, 'SQLITE_MAX_VARIABLES', 7 * 4)
+    operations = [{'op': 'create', 'title': f'bulk {i}', 'status': 'To Do', 'priority': 'Alta'} for i in range(10)]
+    results = client.post('/api/tasks/batch', json={'operations': operations}).get_json()['results']
+    assert [r['task']['title'] for r in results] == [f'bulk {i}' for i in range(10)]
+    assert len({r['id'] for r in results}) == 10